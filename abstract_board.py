@@ -1,8 +1,11 @@
-from beartype.typing import Union, List
-from chess import Move, WHITE, BLACK, Square, Piece
+from beartype.typing import Union, List, Optional
+from chess import Move, WHITE, BLACK, Square, Piece, SquareSet
 
 
 class AbstractBoard:
+    # Side to move (WHITE or BLACK)
+    turn: bool
+
     def generate_capture_moves(self) -> List[Move]:
         raise NotImplementedError
 
@@ -15,9 +18,6 @@ class AbstractBoard:
     def pop(self):
         raise NotImplementedError
 
-    def hash(self):
-        raise NotImplementedError
-
     def is_checkmate(self) -> bool:
         raise NotImplementedError
 
@@ -45,5 +45,48 @@ class AbstractBoard:
     def is_game_over(self, claim_draw: bool) -> bool:
         raise NotImplementedError
 
+    def generate_quiet_moves(self) -> List[Move]:
+        return [move for move in self.generate_legal_moves() if not self.is_capture(move)]
+
     def get_ply(self) -> int:
         return self.ply
+
+    def push_null(self) -> None:
+        """Passes the turn, for null-move pruning."""
+        self.push(Move.null())
+
+    def pop_null(self) -> None:
+        self.pop()
+
+    def peek(self) -> Optional[Move]:
+        raise NotImplementedError
+
+    # The queries below are used by the search and the evaluation
+
+    def hash(self) -> int:
+        raise NotImplementedError
+
+    def is_check(self) -> bool:
+        raise NotImplementedError
+
+    def is_repetition(self, count: int = 3) -> bool:
+        raise NotImplementedError
+
+    def piece_type_at(self, square: Square) -> Union[int, None]:
+        raise NotImplementedError
+
+    def pieces(self, piece_type: int, color: bool) -> SquareSet:
+        raise NotImplementedError
+
+    def attackers(self, color: bool, square: Square) -> SquareSet:
+        raise NotImplementedError
+
+    def attackers_mask(self, color: bool, square: Square, occupied: int = None) -> int:
+        """Attackers as a bitboard, sliding attacks going through the squares missing from occupied."""
+        raise NotImplementedError
+
+    def pieces_mask(self, piece_type: int, color: bool) -> int:
+        raise NotImplementedError
+
+    def occupied_mask(self) -> int:
+        raise NotImplementedError
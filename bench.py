@@ -0,0 +1,248 @@
+"""
+Reproducible benchmark: perft leaf rates, fixed-depth node counts, NPS, time-to-depth and puzzle solve rate on a
+fixed set of positions, written to a JSON results file.
+
+    python -m maxoul_chess.bench --output bench_results.json
+    python -m maxoul_chess.bench --compare bench_baseline.json
+
+With --compare, the run is checked against a saved results file and the regressions are listed (exit code 1 if any).
+Node counts are deterministic, so any change in them means the search itself changed; the timings depend on the
+machine and are compared with a tolerance.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import chess
+from beartype.typing import List
+from maxoul_chess.negamax import negamax_search
+from maxoul_chess.perft import perft
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.legal_moves_generation import MoveOrderingHeuristics
+from maxoul_chess.transposition_table import TranspositionTable
+from maxoul_chess.search_stats import SearchStats
+
+# (name, fen, perft counts from depth 1), from the chessprogramming wiki perft results
+PERFT_SUITE = [
+    ('start', chess.STARTING_FEN, [20, 400, 8902, 197281]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862]),
+    ('position_3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238]),
+    ('position_4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467]),
+    ('position_5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379]),
+]
+
+# (name, fen) searched to a fixed depth
+SEARCH_SUITE = [
+    ('italian', 'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4'),
+    ('open_middlegame', 'r2qkb1r/pp3ppp/2n1bn2/1Bp1N3/4P3/2N5/PPPP2PP/R1BQ1RK1 b kq - 0 8'),
+    ('rook_endgame', '2k2r2/R7/3b4/1R6/n5N1/5PP1/P4PK1/3r4 b - - 2 45'),
+    ('queen_endgame', '8/1p3p2/1Pkn1Q2/2r2P1P/8/5K2/8/8 b - - 0 63'),
+    ('pawn_endgame', '8/5pp1/ppk1p1p1/4P3/3K2P1/1P6/1P3PP1/8 b - - 0 35'),
+]
+
+# (name, fen, best move, depth): the puzzles of tests_engine.py
+PUZZLES = [
+    ('puzzle_1', '1k2rQ2/1p2P3/1Ppq3p/p7/P7/6P1/5P2/5RK1 b - - 2 50', 'e8f8', 2),
+    ('puzzle_2', '8/1p3p2/1Pkn1Q2/2r2P1P/8/5K2/8/8 b - - 0 63', 'c5f5', 5),
+    ('puzzle_3', '8/8/3R4/1pk5/8/P2p3K/1P5P/8 b - - 2 50', 'c5d6', 4),
+    ('puzzle_4', 'r2qkb1r/pp3ppp/2n1bn2/1Bp1N3/4P3/2N5/PPPP2PP/R1BQ1RK1 b kq - 0 8', 'd8d4', 4),
+    ('puzzle_5', '8/5pp1/ppk1p1p1/4P3/3K2P1/1P6/1P3PP1/8 b - - 0 35', 'c6b5', 7),
+]
+
+SEARCH_DEPTH = 5
+CAPTURE_MAX_DEPTH = 2
+
+
+def run_perft(quick: bool = False, repeat: int = 1) -> List[dict]:
+    out = []
+    for name, fen, counts in PERFT_SUITE:
+        depth = len(counts) - 1 if quick else len(counts)
+        board = BitboardChessBoard(fen=fen)
+        seconds = float('inf')
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            nodes = perft(board, depth)
+            seconds = min(seconds, time.perf_counter() - t0)
+        out.append(dict(name=name, depth=depth, nodes=nodes, expected=counts[depth - 1], ok=nodes == counts[depth - 1],
+                        seconds=round(seconds, 4), nps=round(nodes / seconds)))
+    return out
+
+
+def search_position(fen: str, depth: int, capture_max_depth: int = CAPTURE_MAX_DEPTH, repeat: int = 1) -> dict:
+    """
+    Iterative deepening up to depth from a fresh transposition table and fresh move ordering heuristics, with the
+    default options of the bot, as it does for its first move. The evaluation cache is not used, it would make the counts depend on the earlier runs.
+    The search is run repeat times and the fastest run is kept, the node counts being the same every time.
+    """
+    results = [search_once(fen, depth, capture_max_depth) for _ in range(repeat)]
+    return min(results, key=lambda result: result['seconds'])
+
+
+def search_once(fen: str, depth: int, capture_max_depth: int) -> dict:
+    board = BitboardChessBoard(fen=fen)
+    tt = TranspositionTable(size_mb=16)
+    heuristics = MoveOrderingHeuristics()
+    stats = SearchStats()
+    score, best_move = None, None
+    t0 = time.perf_counter()
+    for current_depth in range(1, depth + 1):
+        heuristics.age()
+        score, best_move, _ = negamax_search(board,
+                                             depth=current_depth,
+                                             maximizing_player=(board.turn == chess.WHITE),
+                                             capture_max_depth=capture_max_depth,
+                                             candidate_best_move=best_move,
+                                             use_search_cache=True,
+                                             use_pv_cache=True,
+                                             tt=tt,
+                                             heuristics=heuristics,
+                                             stats=stats,
+                                             null_move=True,
+                                             late_move_reductions=True)
+        stats.record_depth(current_depth, time.perf_counter() - t0, stats.nodes + stats.q_nodes)
+    seconds = time.perf_counter() - t0
+    return dict(depth=depth,
+                nodes=stats.nodes,
+                q_nodes=stats.q_nodes,
+                seconds=round(seconds, 4),
+                nps=round((stats.nodes + stats.q_nodes) / seconds),
+                move=None if best_move is None else best_move.uci(),
+                score=score,
+                time_to_depth=[round(duration, 4) for _, duration, _ in stats.depths],
+                first_move_cutoff_rate=round(stats.first_move_cutoff_rate, 4),
+                tt_hit_rate=round(stats.tt_hit_rate, 4))
+
+
+def run_search(quick: bool = False, repeat: int = 1) -> List[dict]:
+    depth = SEARCH_DEPTH - 1 if quick else SEARCH_DEPTH
+    return [dict(name=name, **search_position(fen, depth, repeat=repeat)) for name, fen in SEARCH_SUITE]
+
+
+def run_puzzles(quick: bool = False) -> List[dict]:
+    out = []
+    for name, fen, best_move, depth in PUZZLES:
+        if quick:
+            depth = min(depth, 4)
+        result = search_position(fen, depth)
+        out.append(dict(name=name, depth=depth, move=result['move'], expected=best_move,
+                        solved=result['move'] == best_move, seconds=result['seconds']))
+    return out
+
+
+def run_bench(quick: bool = False, repeat: int = 3) -> dict:
+    """Timings are the best of repeat runs, to be less sensitive to the load of the machine."""
+    perft_results = run_perft(quick, repeat)
+    search_results = run_search(quick, repeat)
+    puzzle_results = run_puzzles(quick)
+    perft_nodes = sum(result['nodes'] for result in perft_results)
+    perft_seconds = sum(result['seconds'] for result in perft_results)
+    search_nodes = sum(result['nodes'] + result['q_nodes'] for result in search_results)
+    search_seconds = sum(result['seconds'] for result in search_results)
+    summary = dict(perft_ok=all(result['ok'] for result in perft_results),
+                   perft_nps=round(perft_nodes / perft_seconds),
+                   search_nodes=search_nodes,
+                   search_nps=round(search_nodes / search_seconds),
+                   time_to_depth=round(search_seconds, 4),
+                   solve_rate=sum(result['solved'] for result in puzzle_results) / len(puzzle_results))
+    return dict(meta=dict(date=time.strftime('%Y-%m-%d %H:%M:%S'), python=platform.python_version(),
+                          machine=platform.machine(), quick=quick, repeat=repeat),
+                summary=summary, perft=perft_results, search=search_results, puzzles=puzzle_results)
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.1) -> List[str]:
+    """
+    Regressions of results against baseline: wrong perft counts, more search nodes, lower speed beyond the
+    tolerance (a fraction), longer time-to-depth beyond the tolerance and puzzles not solved anymore.
+    """
+    regressions = []
+    if results['meta']['quick'] != baseline['meta']['quick']:
+        regressions.append('quick and full runs are not comparable')
+        return regressions
+
+    for result in results['perft']:
+        if not result['ok']:
+            regressions.append(f"perft {result['name']} depth {result['depth']}: "
+                               f"{result['nodes']} leaves instead of {result['expected']}")
+
+    summary, base = results['summary'], baseline['summary']
+    if summary['perft_nps'] < base['perft_nps'] * (1 - tolerance):
+        regressions.append(f"perft speed {summary['perft_nps']} nps vs {base['perft_nps']}")
+    if summary['search_nps'] < base['search_nps'] * (1 - tolerance):
+        regressions.append(f"search speed {summary['search_nps']} nps vs {base['search_nps']}")
+    if summary['time_to_depth'] > base['time_to_depth'] * (1 + tolerance):
+        regressions.append(f"time to depth {summary['time_to_depth']}s vs {base['time_to_depth']}s")
+
+    base_search = {result['name']: result for result in baseline['search']}
+    for result in results['search']:
+        base_result = base_search.get(result['name'])
+        if base_result is None or base_result['depth'] != result['depth']:
+            continue
+        nodes, base_nodes = result['nodes'] + result['q_nodes'], base_result['nodes'] + base_result['q_nodes']
+        if nodes > base_nodes * (1 + tolerance):
+            regressions.append(f"search {result['name']}: {nodes} nodes vs {base_nodes}")
+
+    base_puzzles = {result['name']: result for result in baseline['puzzles']}
+    for result in results['puzzles']:
+        base_result = base_puzzles.get(result['name'])
+        if base_result is not None and base_result['solved'] and not result['solved']:
+            regressions.append(f"{result['name']} not solved anymore: {result['move']} instead of "
+                               f"{result['expected']}")
+    return regressions
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    def change(key):
+        if baseline is None:
+            return ''
+        base_value = baseline['summary'][key]
+        return f' ({(results["summary"][key] / base_value - 1):+.1%})' if base_value else ''
+
+    for result in results['perft']:
+        print(f"perft {result['name']:<16} depth {result['depth']}: {result['nodes']:>8} leaves "
+              f"{result['seconds']:>7.2f}s {result['nps']:>8} nps {'' if result['ok'] else 'WRONG COUNT'}")
+    for result in results['search']:
+        print(f"search {result['name']:<15} depth {result['depth']}: {result['nodes'] + result['q_nodes']:>8} nodes "
+              f"{result['seconds']:>7.2f}s {result['nps']:>8} nps, move {result['move']}")
+    for result in results['puzzles']:
+        print(f"{result['name']:<22} depth {result['depth']}: {result['move']} "
+              f"{'solved' if result['solved'] else 'expected ' + result['expected']}")
+    summary = results['summary']
+    print(f"perft {summary['perft_nps']} nps{change('perft_nps')}, search {summary['search_nodes']} nodes"
+          f"{change('search_nodes')} {summary['search_nps']} nps{change('search_nps')}, "
+          f"time to depth {summary['time_to_depth']:.2f}s{change('time_to_depth')}, "
+          f"solve rate {summary['solve_rate']:.0%}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='bench_results.json', help='results file to write')
+    parser.add_argument('--compare', default=None, help='baseline results file to check the run against')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown, as a fraction')
+    parser.add_argument('--quick', action='store_true', help='one depth less everywhere')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each measure, the fastest one is kept')
+    args = parser.parse_args(argv)
+
+    results = run_bench(quick=args.quick, repeat=args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f'Results written to {args.output}')
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION:', regression)
+        if regressions:
+            return 1
+        print('No regression against', args.compare)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,721 @@
+"""
+Native bitboard implementation of the AbstractBoard interface.
+
+The position is stored as one python int per (piece, color) plus a 64 entries mailbox, sliding attacks are read
+from precomputed occupancy tables (the same trick python-chess uses, but without the python-chess Board
+machinery on top) and push/pop go through a small undo stack instead of copying the whole board state.
+"""
+import chess
+from beartype.typing import List, Optional
+from chess import Move, Piece, Square, SquareSet, WHITE, BLACK, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING
+from chess.polyglot import POLYGLOT_RANDOM_ARRAY
+
+from maxoul_chess.abstract_board import AbstractBoard
+from maxoul_chess.piece_position_values import piece_raw_values_typed, pst_index, pst_beginning, pst_endgame
+
+BB_ALL = (1 << 64) - 1
+BB_SQUARES = [1 << sq for sq in range(64)]
+BB_LIGHT_SQUARES = 0x55aa55aa55aa55aa
+BB_DARK_SQUARES = 0xaa55aa55aa55aa55
+BB_RANK_1 = 0xff
+BB_RANK_8 = 0xff << 56
+BB_FILE_A = 0x0101010101010101
+BB_FILE_H = BB_FILE_A << 7
+
+# Castling rights, stored as a 4 bits integer
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+
+def piece_code(piece_type: int, color: bool) -> int:
+    """Mailbox code of a piece: the piece type, plus 8 for white pieces."""
+    return piece_type | (color << 3)
+
+
+def lsb(bb: int) -> int:
+    return (bb & -bb).bit_length() - 1
+
+
+def scan_forward(bb: int):
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _step_attacks(square: int, deltas) -> int:
+    out = 0
+    for delta in deltas:
+        target = square + delta
+        if 0 <= target < 64 and abs((target & 7) - (square & 7)) <= 2:
+            out |= BB_SQUARES[target]
+    return out
+
+
+def _sliding_attacks(square: int, occupied: int, deltas) -> int:
+    out = 0
+    for delta in deltas:
+        target = square
+        while True:
+            previous = target
+            target += delta
+            if not 0 <= target < 64 or abs((target & 7) - (previous & 7)) > 1:
+                break
+            out |= BB_SQUARES[target]
+            if occupied & BB_SQUARES[target]:
+                break
+    return out
+
+
+def _edges(square: int) -> int:
+    return (((BB_RANK_1 | BB_RANK_8) & ~(0xff << (8 * (square >> 3)))) |
+            ((BB_FILE_A | BB_FILE_H) & ~(BB_FILE_A << (square & 7))))
+
+
+def _attack_table(deltas):
+    """For each square: the relevant occupancy mask and a dict from masked occupancy to attacked squares."""
+    mask_table = []
+    attack_table = []
+    for square in range(64):
+        mask = _sliding_attacks(square, 0, deltas) & ~_edges(square)
+        attacks = {}
+        subset = 0
+        while True:  # Carry-rippler trick to enumerate all the subsets of the mask
+            attacks[subset] = _sliding_attacks(square, subset, deltas)
+            subset = (subset - mask) & mask
+            if not subset:
+                break
+        mask_table.append(mask)
+        attack_table.append(attacks)
+    return mask_table, attack_table
+
+
+KNIGHT_ATTACKS = [_step_attacks(sq, [17, 15, 10, 6, -17, -15, -10, -6]) for sq in range(64)]
+KING_ATTACKS = [_step_attacks(sq, [9, 8, 7, 1, -9, -8, -7, -1]) for sq in range(64)]
+# PAWN_ATTACKS[color][square]: squares attacked by a pawn of this color standing on square
+PAWN_ATTACKS = [[_step_attacks(sq, [-7, -9]) for sq in range(64)],
+                [_step_attacks(sq, [7, 9]) for sq in range(64)]]
+
+DIAG_MASKS, DIAG_ATTACKS = _attack_table([9, 7, -9, -7])
+FILE_MASKS, FILE_ATTACKS = _attack_table([8, -8])
+RANK_MASKS, RANK_ATTACKS = _attack_table([1, -1])
+ROOK_EMPTY_ATTACKS = [_sliding_attacks(sq, 0, [8, -8, 1, -1]) for sq in range(64)]
+BISHOP_EMPTY_ATTACKS = [_sliding_attacks(sq, 0, [9, 7, -9, -7]) for sq in range(64)]
+
+
+def _line_and_between():
+    line = [[0] * 64 for _ in range(64)]
+    between = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for deltas in ([9, 7, -9, -7], [8, -8, 1, -1]):
+            for delta in deltas:
+                ray = _sliding_attacks(a, 0, [delta])
+                full_line = ray | _sliding_attacks(a, 0, [-delta]) | BB_SQUARES[a]
+                for b in scan_forward(ray):
+                    line[a][b] = full_line
+                    between[a][b] = ray & _sliding_attacks(b, 0, [-delta])
+    return line, between
+
+
+LINE, BETWEEN = _line_and_between()
+
+# Castling rights kept when a piece leaves or lands on a square
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[chess.E1] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[chess.H1] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASKS[chess.A1] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASKS[chess.E8] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[chess.H8] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASKS[chess.A8] = 15 & ~BLACK_QUEENSIDE
+
+# King destination -> (rook origin, rook destination)
+CASTLING_ROOK_MOVES = {chess.G1: (chess.H1, chess.F1), chess.C1: (chess.A1, chess.D1),
+                       chess.G8: (chess.H8, chess.F8), chess.C8: (chess.A8, chess.D8)}
+
+# Move objects are immutable: we build them once and reuse them everywhere.
+MOVES = [[Move(from_square, to_square) for to_square in range(64)] for from_square in range(64)]
+PROMOTION_MOVES = [[[Move(from_square, to_square, promotion) for promotion in (QUEEN, ROOK, BISHOP, KNIGHT)]
+                    for to_square in range(64)] for from_square in range(64)]
+PIECES = {piece_code(piece_type, color): Piece(piece_type, color)
+          for piece_type in range(1, 7) for color in (WHITE, BLACK)}
+
+
+# Polyglot zobrist keys, so that our incremental key matches chess.polyglot.zobrist_hash
+PIECE_KEYS = [[0] * 64 for _ in range(16)]
+for _piece_type in range(1, 7):
+    for _color in (WHITE, BLACK):
+        PIECE_KEYS[piece_code(_piece_type, _color)] = [POLYGLOT_RANDOM_ARRAY[64 * ((_piece_type - 1) * 2 + _color) + sq]
+                                                       for sq in range(64)]
+CASTLING_KEYS = [0] * 16
+for _castling in range(16):
+    for _index in range(4):
+        if _castling & (1 << _index):
+            CASTLING_KEYS[_castling] ^= POLYGLOT_RANDOM_ARRAY[768 + _index]
+EP_KEYS = [POLYGLOT_RANDOM_ARRAY[772 + (sq & 7)] for sq in range(64)]
+TURN_KEY = POLYGLOT_RANDOM_ARRAY[780]
+
+# Incremental evaluation: the raw value plus the beginning table value and the raw value plus the endgame table
+# value of a piece are packed in a single int (endgame part in the high bits), signed from white's point of view.
+# Summing packed scores sums both parts at once.
+SCORE_SHIFT = 32
+
+
+def pack_score(beginning: int, endgame: int) -> int:
+    return (endgame << SCORE_SHIFT) + beginning
+
+
+def unpack_score(score: int):
+    beginning = ((score + (1 << (SCORE_SHIFT - 1))) & ((1 << SCORE_SHIFT) - 1)) - (1 << (SCORE_SHIFT - 1))
+    return beginning, (score - beginning) >> SCORE_SHIFT
+
+
+PIECE_SQUARE_SCORES = [[0] * 64 for _ in range(16)]
+NON_PAWN_VALUES = [0] * 16
+for _piece_type in range(1, 7):
+    for _color, _sign in ((WHITE, 1), (BLACK, -1)):
+        _code = piece_code(_piece_type, _color)
+        _raw = piece_raw_values_typed[_piece_type]
+        _offset = pst_index(_piece_type, _color)
+        PIECE_SQUARE_SCORES[_code] = [_sign * pack_score(_raw + pst_beginning[_offset + square],
+                                                         _raw + pst_endgame[_offset + square])
+                                      for square in range(64)]
+        NON_PAWN_VALUES[_code] = _raw if _piece_type != PAWN else 0
+
+
+class BitboardChessBoard(AbstractBoard):
+    def __init__(self, fen: str = chess.STARTING_FEN, board: chess.Board = None):
+        if board is not None:
+            # We replay the game from its root so that the repetition history is known
+            self.set_fen(board.root().fen())
+            for move in board.move_stack:
+                self.push(move)
+        else:
+            self.set_fen(fen)
+
+    def set_fen(self, fen: str) -> None:
+        parts = fen.split()
+        self.squares = [0] * 64
+        self.bb = [0] * 16
+        self.occupied_co = [0, 0]
+        rank = 7
+        file = 0
+        for char in parts[0]:
+            if char == '/':
+                rank -= 1
+                file = 0
+            elif char.isdigit():
+                file += int(char)
+            else:
+                square = 8 * rank + file
+                code = piece_code(chess.PIECE_SYMBOLS.index(char.lower()), char.isupper())
+                self.squares[square] = code
+                self.bb[code] |= BB_SQUARES[square]
+                self.occupied_co[code >> 3] |= BB_SQUARES[square]
+                file += 1
+
+        self.turn = WHITE if len(parts) < 2 or parts[1] == 'w' else BLACK
+
+        self.castling = 0
+        castling_str = parts[2] if len(parts) > 2 else '-'
+        for char, right in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                            ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE)):
+            if char in castling_str:
+                self.castling |= right
+
+        # We only keep the en passant square when a pawn can actually take on it, like polyglot does
+        self.ep_square = None
+        if len(parts) > 3 and parts[3] != '-':
+            ep_square = chess.parse_square(parts[3])
+            if PAWN_ATTACKS[not self.turn][ep_square] & self.bb[piece_code(PAWN, self.turn)]:
+                self.ep_square = ep_square
+
+        self.halfmove_clock = int(parts[4]) if len(parts) > 4 else 0
+        fullmove_number = int(parts[5]) if len(parts) > 5 else 1
+        self.ply = 2 * (fullmove_number - 1) + (self.turn == BLACK)
+        self._stack = []
+
+        # Evaluation accumulators, updated in push and restored in pop
+        self.score = 0
+        self.non_pawn_material = 0
+        for square, code in enumerate(self.squares):
+            if code:
+                self.score += PIECE_SQUARE_SCORES[code][square]
+                self.non_pawn_material += NON_PAWN_VALUES[code]
+
+        # Zobrist key, xor-updated in push and restored in pop
+        self.key = self.compute_hash()
+
+    def fen(self) -> str:
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ''
+            empty = 0
+            for file in range(8):
+                code = self.squares[8 * rank + file]
+                if code:
+                    if empty:
+                        row += str(empty)
+                        empty = 0
+                    row += PIECES[code].symbol()
+                else:
+                    empty += 1
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        castling_str = ''.join(char for char, right in (('K', WHITE_KINGSIDE), ('Q', WHITE_QUEENSIDE),
+                                                        ('k', BLACK_KINGSIDE), ('q', BLACK_QUEENSIDE))
+                               if self.castling & right) or '-'
+        ep_str = chess.square_name(self.ep_square) if self.ep_square is not None else '-'
+        return f"{'/'.join(rows)} {'w' if self.turn else 'b'} {castling_str} {ep_str} " \
+               f"{self.halfmove_clock} {self.ply // 2 + 1}"
+
+    def __str__(self):
+        return str(chess.Board(self.fen()))
+
+    # Attacks
+
+    def attackers_mask(self, color: bool, square: Square, occupied: int = None) -> int:
+        bb = self.bb
+        if occupied is None:
+            occupied = self.occupied_co[WHITE] | self.occupied_co[BLACK]
+        offset = color << 3
+        queens = bb[QUEEN | offset]
+        return ((KNIGHT_ATTACKS[square] & bb[KNIGHT | offset]) |
+                (KING_ATTACKS[square] & bb[KING | offset]) |
+                (PAWN_ATTACKS[not color][square] & bb[PAWN | offset]) |
+                ((RANK_ATTACKS[square][occupied & RANK_MASKS[square]] |
+                  FILE_ATTACKS[square][occupied & FILE_MASKS[square]]) & (bb[ROOK | offset] | queens)) |
+                (DIAG_ATTACKS[square][occupied & DIAG_MASKS[square]] & (bb[BISHOP | offset] | queens)))
+
+    def attackers(self, color: bool, square: Square) -> SquareSet:
+        return SquareSet(self.attackers_mask(color, square))
+
+    def is_attacked_by(self, color: bool, square: Square) -> bool:
+        return bool(self.attackers_mask(color, square))
+
+    def checkers_mask(self) -> int:
+        return self.attackers_mask(not self.turn, lsb(self.bb[KING | (self.turn << 3)]))
+
+    def is_check(self) -> bool:
+        return bool(self.checkers_mask())
+
+    # Move generation
+
+    def _pinned_mask(self, king: int, us: bool, occupied: int) -> int:
+        them_offset = (not us) << 3
+        bb = self.bb
+        queens = bb[QUEEN | them_offset]
+        snipers = ((ROOK_EMPTY_ATTACKS[king] & (bb[ROOK | them_offset] | queens)) |
+                   (BISHOP_EMPTY_ATTACKS[king] & (bb[BISHOP | them_offset] | queens)))
+        pinned = 0
+        for sniper in scan_forward(snipers):
+            blockers = BETWEEN[king][sniper] & occupied
+            if blockers and not blockers & (blockers - 1):
+                pinned |= blockers
+        return pinned & self.occupied_co[us]
+
+    def _is_safe_en_passant(self, king: int, from_square: int, to_square: int, captured_square: int) -> bool:
+        us = self.turn
+        occupied = ((self.occupied_co[WHITE] | self.occupied_co[BLACK]) ^ BB_SQUARES[from_square]
+                    ^ BB_SQUARES[captured_square]) | BB_SQUARES[to_square]
+        return not self.attackers_mask(not us, king, occupied) & ~BB_SQUARES[captured_square]
+
+    def _generate_moves(self, target_filter: int = BB_ALL, en_passant: bool = True) -> List[Move]:
+        """Legal moves whose destination lies in target_filter, plus the en passant captures if asked for."""
+        us = self.turn
+        them = not us
+        bb = self.bb
+        squares = self.squares
+        us_offset = us << 3
+        our_pieces = self.occupied_co[us]
+        their_pieces = self.occupied_co[them]
+        occupied = our_pieces | their_pieces
+        king = lsb(bb[KING | us_offset])
+        moves = []
+        append = moves.append
+
+        # King moves: the king must not land on an attacked square, itself removed from the occupancy
+        occupied_without_king = occupied ^ BB_SQUARES[king]
+        king_moves = MOVES[king]
+        for to_square in scan_forward(KING_ATTACKS[king] & ~our_pieces & target_filter):
+            if not self.attackers_mask(them, to_square, occupied_without_king):
+                append(king_moves[to_square])
+
+        checkers = self.attackers_mask(them, king, occupied)
+        if checkers & (checkers - 1):  # Double check: only the king can move
+            return moves
+
+        if checkers:
+            target = (BETWEEN[king][lsb(checkers)] | checkers) & target_filter
+        else:
+            target = ~our_pieces & target_filter
+            # Castling, only when not in check
+            castling = self.castling
+            if castling:
+                if us:
+                    if castling & WHITE_KINGSIDE and not occupied & 0x60 and target_filter & 0x40 \
+                            and not self.attackers_mask(them, chess.F1, occupied) \
+                            and not self.attackers_mask(them, chess.G1, occupied):
+                        append(MOVES[chess.E1][chess.G1])
+                    if castling & WHITE_QUEENSIDE and not occupied & 0x0e and target_filter & 0x04 \
+                            and not self.attackers_mask(them, chess.D1, occupied) \
+                            and not self.attackers_mask(them, chess.C1, occupied):
+                        append(MOVES[chess.E1][chess.C1])
+                else:
+                    if castling & BLACK_KINGSIDE and not occupied & (0x60 << 56) and target_filter & (0x40 << 56) \
+                            and not self.attackers_mask(them, chess.F8, occupied) \
+                            and not self.attackers_mask(them, chess.G8, occupied):
+                        append(MOVES[chess.E8][chess.G8])
+                    if castling & BLACK_QUEENSIDE and not occupied & (0x0e << 56) and target_filter & (0x04 << 56) \
+                            and not self.attackers_mask(them, chess.D8, occupied) \
+                            and not self.attackers_mask(them, chess.C8, occupied):
+                        append(MOVES[chess.E8][chess.C8])
+
+        pinned = self._pinned_mask(king, us, occupied)
+        line_from_king = LINE[king]
+
+        # Knights, bishops, rooks, queens
+        for piece_type in (KNIGHT, BISHOP, ROOK, QUEEN):
+            for from_square in scan_forward(bb[piece_type | us_offset]):
+                if piece_type == KNIGHT:
+                    if pinned & BB_SQUARES[from_square]:
+                        continue  # A pinned knight can never move
+                    attacks = KNIGHT_ATTACKS[from_square]
+                elif piece_type == BISHOP:
+                    attacks = DIAG_ATTACKS[from_square][occupied & DIAG_MASKS[from_square]]
+                elif piece_type == ROOK:
+                    attacks = (RANK_ATTACKS[from_square][occupied & RANK_MASKS[from_square]] |
+                               FILE_ATTACKS[from_square][occupied & FILE_MASKS[from_square]])
+                else:
+                    attacks = (DIAG_ATTACKS[from_square][occupied & DIAG_MASKS[from_square]] |
+                               RANK_ATTACKS[from_square][occupied & RANK_MASKS[from_square]] |
+                               FILE_ATTACKS[from_square][occupied & FILE_MASKS[from_square]])
+                attacks &= target
+                if pinned & BB_SQUARES[from_square]:
+                    attacks &= line_from_king[from_square]
+                from_moves = MOVES[from_square]
+                for to_square in scan_forward(attacks):
+                    append(from_moves[to_square])
+
+        # Pawns
+        pawns = bb[PAWN | us_offset]
+        if pawns:
+            empty = ~occupied & BB_ALL
+            if us:
+                single_pushes = (pawns << 8) & empty
+                double_pushes = ((single_pushes & 0xff0000) << 8) & empty
+                left_captures = ((pawns & ~BB_FILE_A) << 7) & their_pieces
+                right_captures = ((pawns & ~BB_FILE_H) << 9) & their_pieces
+                backward = (8, 16, 7, 9)
+                last_rank = BB_RANK_8
+            else:
+                single_pushes = (pawns >> 8) & empty
+                double_pushes = ((single_pushes & (0xff << 40)) >> 8) & empty
+                left_captures = ((pawns & ~BB_FILE_A) >> 9) & their_pieces
+                right_captures = ((pawns & ~BB_FILE_H) >> 7) & their_pieces
+                backward = (-8, -16, -9, -7)
+                last_rank = BB_RANK_1
+
+            for destinations, step in ((single_pushes, backward[0]), (double_pushes, backward[1]),
+                                       (left_captures, backward[2]), (right_captures, backward[3])):
+                for to_square in scan_forward(destinations & target):
+                    from_square = to_square - step
+                    if pinned & BB_SQUARES[from_square] and not line_from_king[from_square] & BB_SQUARES[to_square]:
+                        continue
+                    if BB_SQUARES[to_square] & last_rank:
+                        for move in PROMOTION_MOVES[from_square][to_square]:
+                            append(move)
+                    else:
+                        append(MOVES[from_square][to_square])
+
+            ep_square = self.ep_square
+            if en_passant and ep_square is not None:
+                captured_square = ep_square - 8 if us else ep_square + 8
+                for from_square in scan_forward(PAWN_ATTACKS[them][ep_square] & pawns):
+                    if self._is_safe_en_passant(king, from_square, ep_square, captured_square):
+                        append(MOVES[from_square][ep_square])
+
+        return moves
+
+    def generate_legal_moves(self) -> List[Move]:
+        return self._generate_moves()
+
+    def generate_capture_moves(self) -> List[Move]:
+        return self._generate_moves(self.occupied_co[not self.turn])
+
+    def generate_quiet_moves(self) -> List[Move]:
+        return self._generate_moves(~self.occupied_co[not self.turn] & BB_ALL, en_passant=False)
+
+    def has_legal_moves(self) -> bool:
+        return bool(self._generate_moves())
+
+    # Make / unmake
+
+    def push(self, move: Move) -> None:
+        from_square = move.from_square
+        to_square = move.to_square
+        squares = self.squares
+        bb = self.bb
+        occupied_co = self.occupied_co
+        us = self.turn
+        them = not us
+        code = squares[from_square]
+        captured = squares[to_square]
+        ep_square = self.ep_square
+        halfmove_clock = self.halfmove_clock
+
+        score = self.score
+        non_pawn_material = self.non_pawn_material
+        key = self.key
+        castling = self.castling
+
+        self._stack.append((move, captured, castling, ep_square, halfmove_clock, score, non_pawn_material, key))
+
+        to_bb = BB_SQUARES[to_square]
+        from_to_bb = BB_SQUARES[from_square] | to_bb
+        if captured:
+            bb[captured] ^= to_bb
+            occupied_co[them] ^= to_bb
+            halfmove_clock = -1
+            score -= PIECE_SQUARE_SCORES[captured][to_square]
+            non_pawn_material -= NON_PAWN_VALUES[captured]
+            key ^= PIECE_KEYS[captured][to_square]
+        piece_square_scores = PIECE_SQUARE_SCORES[code]
+        score += piece_square_scores[to_square] - piece_square_scores[from_square]
+        piece_keys = PIECE_KEYS[code]
+        key ^= piece_keys[from_square] ^ piece_keys[to_square] ^ TURN_KEY
+        if ep_square is not None:
+            key ^= EP_KEYS[ep_square]
+        bb[code] ^= from_to_bb
+        occupied_co[us] ^= from_to_bb
+        squares[from_square] = 0
+        squares[to_square] = code
+        self.ep_square = None
+
+        piece_type = code & 7
+        if piece_type == PAWN:
+            halfmove_clock = -1
+            if move.promotion:
+                promoted = move.promotion | (us << 3)
+                bb[code] ^= to_bb
+                bb[promoted] |= to_bb
+                squares[to_square] = promoted
+                score += PIECE_SQUARE_SCORES[promoted][to_square] - piece_square_scores[to_square]
+                non_pawn_material += NON_PAWN_VALUES[promoted]
+                key ^= piece_keys[to_square] ^ PIECE_KEYS[promoted][to_square]
+            elif to_square == ep_square:
+                captured_square = to_square - 8 if us else to_square + 8
+                captured_code = PAWN | (them << 3)
+                bb[captured_code] ^= BB_SQUARES[captured_square]
+                occupied_co[them] ^= BB_SQUARES[captured_square]
+                squares[captured_square] = 0
+                score -= PIECE_SQUARE_SCORES[captured_code][captured_square]
+                key ^= PIECE_KEYS[captured_code][captured_square]
+            elif to_square - from_square == 16 or from_square - to_square == 16:
+                candidate = (from_square + to_square) >> 1
+                if PAWN_ATTACKS[us][candidate] & bb[PAWN | (them << 3)]:
+                    self.ep_square = candidate
+                    key ^= EP_KEYS[candidate]
+        elif piece_type == KING and (to_square - from_square == 2 or from_square - to_square == 2):
+            rook_from, rook_to = CASTLING_ROOK_MOVES[to_square]
+            rook_code = ROOK | (us << 3)
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            bb[rook_code] ^= rook_bb
+            occupied_co[us] ^= rook_bb
+            squares[rook_from] = 0
+            squares[rook_to] = rook_code
+            score += PIECE_SQUARE_SCORES[rook_code][rook_to] - PIECE_SQUARE_SCORES[rook_code][rook_from]
+            key ^= PIECE_KEYS[rook_code][rook_from] ^ PIECE_KEYS[rook_code][rook_to]
+
+        if castling:
+            self.castling = castling & CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+            key ^= CASTLING_KEYS[castling] ^ CASTLING_KEYS[self.castling]
+
+        self.key = key
+        self.score = score
+        self.non_pawn_material = non_pawn_material
+        self.halfmove_clock = halfmove_clock + 1
+        self.turn = them
+        self.ply += 1
+
+    def pop(self) -> Move:
+        move, captured, castling, ep_square, halfmove_clock, self.score, self.non_pawn_material, self.key = \
+            self._stack.pop()
+        from_square = move.from_square
+        to_square = move.to_square
+        squares = self.squares
+        bb = self.bb
+        occupied_co = self.occupied_co
+        them = self.turn
+        us = not them
+
+        code = squares[to_square]
+        to_bb = BB_SQUARES[to_square]
+        from_to_bb = BB_SQUARES[from_square] | to_bb
+        if move.promotion:
+            bb[code] ^= to_bb
+            code = PAWN | (us << 3)
+            bb[code] |= BB_SQUARES[from_square]
+        else:
+            bb[code] ^= from_to_bb
+        occupied_co[us] ^= from_to_bb
+        squares[from_square] = code
+        squares[to_square] = captured
+
+        if captured:
+            bb[captured] |= to_bb
+            occupied_co[them] |= to_bb
+        elif to_square == ep_square and code & 7 == PAWN:
+            captured_square = to_square - 8 if us else to_square + 8
+            captured_code = PAWN | (them << 3)
+            bb[captured_code] |= BB_SQUARES[captured_square]
+            occupied_co[them] |= BB_SQUARES[captured_square]
+            squares[captured_square] = captured_code
+        elif code & 7 == KING and (to_square - from_square == 2 or from_square - to_square == 2):
+            rook_from, rook_to = CASTLING_ROOK_MOVES[to_square]
+            rook_code = ROOK | (us << 3)
+            rook_bb = BB_SQUARES[rook_from] | BB_SQUARES[rook_to]
+            bb[rook_code] ^= rook_bb
+            occupied_co[us] ^= rook_bb
+            squares[rook_to] = 0
+            squares[rook_from] = rook_code
+
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        self.turn = us
+        self.ply -= 1
+        return move
+
+    def push_null(self) -> None:
+        """
+        Passes the turn. The halfmove clock restarts from 0, so that no repetition is looked for across the null move.
+        """
+        key = self.key ^ TURN_KEY
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square]
+        self._stack.append((Move.null(), 0, self.castling, self.ep_square, self.halfmove_clock, self.score,
+                            self.non_pawn_material, self.key))
+        self.key = key
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.turn = not self.turn
+        self.ply += 1
+
+    def pop_null(self) -> None:
+        _, _, self.castling, self.ep_square, self.halfmove_clock, self.score, self.non_pawn_material, self.key = \
+            self._stack.pop()
+        self.turn = not self.turn
+        self.ply -= 1
+
+    def peek(self) -> Optional[Move]:
+        return self._stack[-1][0] if self._stack else None
+
+    # Queries
+
+    def piece_at(self, square: Square) -> Optional[Piece]:
+        code = self.squares[square]
+        return PIECES[code] if code else None
+
+    def piece_type_at(self, square: Square) -> Optional[int]:
+        return (self.squares[square] & 7) or None
+
+    def pieces_mask(self, piece_type: int, color: bool) -> int:
+        return self.bb[piece_type | (color << 3)]
+
+    def pieces(self, piece_type: int, color: bool) -> SquareSet:
+        return SquareSet(self.bb[piece_type | (color << 3)])
+
+    def occupied_mask(self) -> int:
+        return self.occupied_co[WHITE] | self.occupied_co[BLACK]
+
+    def is_capture(self, move: Move) -> bool:
+        return bool(self.squares[move.to_square]) or \
+            (move.to_square == self.ep_square and self.squares[move.from_square] & 7 == PAWN)
+
+    def gives_check(self, move: Move) -> bool:
+        self.push(move)
+        out = self.is_check()
+        self.pop()
+        return out
+
+    def hash(self) -> int:
+        """
+        Polyglot zobrist key of the position, maintained in push/pop. Same value as chess.polyglot.zobrist_hash: the
+        en passant file is hashed as soon as a pawn of the side to move attacks the square, even if the capture is
+        illegal (pinned pawn), which is also why ep_square is only kept in that case.
+        """
+        return self.key
+
+    def compute_hash(self) -> int:
+        """Zobrist key computed from scratch."""
+        key = CASTLING_KEYS[self.castling]
+        for square in scan_forward(self.occupied_co[WHITE] | self.occupied_co[BLACK]):
+            key ^= PIECE_KEYS[self.squares[square]][square]
+        if self.ep_square is not None:
+            key ^= EP_KEYS[self.ep_square]
+        if self.turn:
+            key ^= TURN_KEY
+        return key
+
+    def is_repetition(self, count: int = 3) -> bool:
+        # A position can only repeat since the last capture or pawn move, and cycles take at least 4 plies
+        stack = self._stack
+        max_plies = min(self.halfmove_clock, len(stack))
+        if max_plies < 4 * (count - 1):
+            return False
+
+        # stack[-n] holds the key of the position n plies ago
+        key = self.key
+        occurrences = 1
+        for plies_ago in range(4, max_plies + 1, 2):
+            if stack[-plies_ago][-1] == key:
+                occurrences += 1
+                if occurrences >= count:
+                    return True
+        return False
+
+    def is_checkmate(self) -> bool:
+        return self.is_check() and not self.has_legal_moves()
+
+    def is_stalemate(self) -> bool:
+        return not self.is_check() and not self.has_legal_moves()
+
+    def winner(self) -> Optional[bool]:
+        if self.is_checkmate():
+            return not self.turn
+        return None
+
+    def has_insufficient_material(self, color: bool) -> bool:
+        bb = self.bb
+        offset = color << 3
+        if bb[PAWN | offset] | bb[ROOK | offset] | bb[QUEEN | offset]:
+            return False
+        their_offset = (not color) << 3
+        if bb[KNIGHT | offset]:
+            # A lone knight can only mate if the opponent has pieces (other than queens) to block his king with
+            return bin(self.occupied_co[color]).count('1') <= 2 and \
+                not self.occupied_co[not color] & ~bb[KING | their_offset] & ~bb[QUEEN | their_offset]
+        if bb[BISHOP | offset]:
+            bishops = bb[BISHOP | 8] | bb[BISHOP]
+            same_color = not bishops & BB_DARK_SQUARES or not bishops & BB_LIGHT_SQUARES
+            return same_color and not (bb[PAWN | 8] | bb[PAWN]) and not (bb[KNIGHT | 8] | bb[KNIGHT])
+        return True
+
+    def is_insufficient_material(self) -> bool:
+        return self.has_insufficient_material(WHITE) and self.has_insufficient_material(BLACK)
+
+    def is_fifty_moves(self) -> bool:
+        return self.halfmove_clock >= 100 and self.has_legal_moves()
+
+    def is_game_over(self, claim_draw: bool = False) -> bool:
+        if not self.has_legal_moves():
+            return True
+        if self.is_insufficient_material() or self.halfmove_clock >= 150 or self.is_repetition(5):
+            return True
+        if claim_draw:
+            return self.halfmove_clock >= 100 or self.is_repetition(3)
+        return False
@@ -1,41 +1,109 @@
-from maxoul_chess.search import min_max_search, pv_cache, search_cache
-from maxoul_chess.python_chess_board import PythonChessBoard
-from maxoul_chess.utils import LimitedHashTable
-from maxoul_chess.evaluation import evaluation_cache, evaluate_material
-from maxoul_chess.legal_moves_generation import get_quiescence_moves, order_moves, selected_move_priority
+from maxoul_chess.negamax import negamax_search, create_root_split_pool, plies_to_mate
+from maxoul_chess.transposition_table import TranspositionTable, SharedTranspositionTable
+from maxoul_chess.lazy_smp import LazySMP
+from maxoul_chess.search_context import SearchContext
+from maxoul_chess.search_stats import SearchStats, StatsSink
+from maxoul_chess.time_manager import TimeManager
+from maxoul_chess.stop_token import StopToken
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.evaluation import evaluation_cache
+from maxoul_chess.legal_moves_generation import get_quiescence_moves, MoveOrderingHeuristics
 import chess
 import time
 import random
-import numpy as np
+from beartype.typing import Optional
 
 
 # TODO: hash (for both stuff plz)
 # TODO: ordering of moves in iterative deepening
-# delta pruning, and improvements to quiescence
+
+# Pondering stops by itself after this many seconds if the opponent never answers
+MAX_PONDER_TIME = 3600
+
+# Aspiration windows: widening factor of the failing side after a miss, and size from which it is fully opened
+ASPIRATION_GROWTH = 2
+ASPIRATION_MAX_WINDOW = 1000
 
 
 class MaxoulBot:
     def __init__(self,
                  max_depth: int = 5,
                  capture_max_depth: int = 0,
-                 use_search_cache: bool = False,
+                 use_search_cache: bool = True,
                  use_eval_cache: bool = False,
                  use_pv_cache: bool = True,
-                 pruning: bool = True):
+                 pruning: bool = True,
+                 null_move: bool = True,
+                 late_move_reductions: bool = True,
+                 tt_mb: float = 64,
+                 n_workers: int = 1,
+                 parallel_mode: str = 'lazy_smp',
+                 ponder: bool = False,
+                 verbose: bool = True,
+                 stats_sink: StatsSink = None,
+                 stop_token: StopToken = None):
+        """
+        :param null_move: null-move pruning, skipped in check and when the side to move only has pawns.
+        :param late_move_reductions: search the quiet moves late in the move ordering with a reduced depth first.
+        :param tt_mb: memory budget, in megabytes, of the transposition table backing the search and pv caches.
+        :param n_workers: number of processes searching each move. Above 1, helper processes search alongside the
+        main one (lazy SMP) and the transposition table lives in shared memory.
+        :param parallel_mode: 'lazy_smp', or 'root_split' to share out the root moves over a pool of n_workers
+        processes, kept alive across moves.
+        :param ponder: after each move, search the expected reply of the opponent in a background process during
+        their time. The transposition table then lives in shared memory.
+        :param verbose: print the progress of the search. The bot does not print anything otherwise.
+        :param stats_sink: called with the SearchStats of each move, e.g. a search_stats.JsonLinesSink.
+        :param stop_token: stops the search of the current move when set, see stop. A shared one can be set from
+        another process, e.g. by the game server when a game is aborted.
+        """
         self.max_depth = max_depth
         self.capture_max_depth = capture_max_depth
         self.pruning = pruning
+        self.null_move = null_move
+        self.late_move_reductions = late_move_reductions
         self.current_cadence = 180
         self.use_search_cache = use_search_cache
         self.use_pv_cache = use_pv_cache
         self.use_eval_cache = use_eval_cache
-
-    def time_allowance(self, board, time_limit):
-        print(time_limit)
-        ply = board.ply()
+        self.move_ordering = MoveOrderingHeuristics()
+        self.n_workers = n_workers
+        self.lazy_smp = None
+        self.executor = None
+        if n_workers > 1 or ponder:
+            self.transposition_table = SharedTranspositionTable(size_mb=tt_mb)
+        else:
+            self.transposition_table = TranspositionTable(size_mb=tt_mb)
+        if n_workers > 1 and parallel_mode == 'root_split':
+            self.executor = create_root_split_pool(n_workers, tt_mb=tt_mb)
+        elif n_workers > 1:
+            self.lazy_smp = LazySMP(n_workers - 1, self.transposition_table)
+        if stop_token is None:
+            # Shared with the root split workers, so that they stop with the main search
+            stop_token = StopToken(shared=self.executor is not None)
+        self.stop_token = stop_token
+        # Kept from one move to the next of the current game
+        self.context = SearchContext(self.transposition_table, self.move_ordering)
+
+        self.ponder = ponder
+        self.ponder_search = None  # background search of the expected position
+        self.ponder_key = None
+        self.ponder_move = None
+        self.n_ponder_hits = 0
+
+        self.verbose = verbose
+        self.stats_sink = stats_sink
+        self.last_stats = None
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    @staticmethod
+    def clock(board, time_limit):
+        """Time left and increment of the side to move, 180 seconds without increment when unknown."""
         increment = 0
         time_left = 180
-
         if time_limit is not None:
             if board.turn == chess.WHITE:
                 if time_limit.white_clock is not None:
@@ -47,7 +115,14 @@ class MaxoulBot:
                     time_left = time_limit.black_clock
                 if time_limit.black_inc is not None:
                     increment = time_limit.black_inc
+        return time_left, increment
 
+    def time_allowance(self, board, time_limit):
+        self.log(time_limit)
+        ply = board.ply()
+        time_left, increment = self.clock(board, time_limit)
+
+        if time_limit is not None:
             # At first, we get the total time ! to calibrate all moves later on.
             # I did not found a better way than this syntax with lichess:
             if 2 <= ply <= 4:
@@ -72,11 +147,17 @@ class MaxoulBot:
             allowed_time = time_left / 5
 
         allowed_time = min(allowed_time, 0.5 * time_left) + increment * 0.8
-        print(f"Ply {ply} time left {time_left}"
-              f" increment {increment} allowance {allowed_time:.2f}")
+        self.log(f"Ply {ply} time left {time_left}"
+                 f" increment {increment} allowance {allowed_time:.2f}")
 
         return allowed_time
 
+    def time_manager(self, board, time_limit) -> TimeManager:
+        """The time allowance as the soft limit of the move, the clock bounding its hard limit."""
+        soft_limit = self.time_allowance(board, time_limit)
+        time_left, increment = self.clock(board, time_limit)
+        return TimeManager(soft_limit, time_left, increment)
+
     def aspiration_window_size(self, depth):
         if depth == 1:
             return 400
@@ -91,32 +172,92 @@ class MaxoulBot:
         else:
             return 40
 
-    def log_infos(self):
-        if self.use_search_cache:
-            print('Search cache stats:', search_cache.get_stats_str())
+    def start_pondering(self, board: chess.Board, move: chess.Move):
+        """Searches, in the background, the position after move and the reply the table expects."""
+        if not isinstance(self.transposition_table, SharedTranspositionTable):
+            self.log('Pondering needs a bot created with ponder=True')
+            return
+        expected_reply = self.context.expected_reply()
+        if expected_reply is None:
+            self.log('No expected reply, not pondering')
+            return
+        ponder_board = board.copy()
+        ponder_board.push(move)
+        ponder_board.push(expected_reply)
+        maxoul_board = BitboardChessBoard(board=ponder_board)
+
+        # The entries of the ponder search belong to our next move
+        self.transposition_table.new_search(age=ponder_board.fullmove_number)
+        self.ponder_search = LazySMP(1, self.transposition_table)
+        self.ponder_search.start(ponder_board, self.max_depth, time.time() + MAX_PONDER_TIME,
+                                 self.capture_max_depth, self.pruning, self.null_move, self.late_move_reductions)
+        self.ponder_key = maxoul_board.hash()
+        self.ponder_move = expected_reply
+        self.log(f'Pondering on {expected_reply}')
+
+    def stop_pondering(self, key: int = None):
+        """
+        Stops the background search.
+        :return: the depths it completed, as (depth, evaluation, move, helper index), if it was pondering on the
+        position of key. An empty list otherwise.
+        """
+        if self.ponder_search is None:
+            return []
+        results = self.ponder_search.stop()
+        self.ponder_search = None
+        if key != self.ponder_key:
+            self.log(f'Ponder miss, expected {self.ponder_move}')
+            return []
+        self.n_ponder_hits += 1
+        return results
+
+    def stop(self):
+        """
+        Stops the search of the current move, e.g. from a GUI thread: play_time_opt returns at once with the best
+        move of the depths completed so far.
+        """
+        self.stop_token.set()
+
+    def close(self):
+        """Releases the shared memory of the transposition table and the process pool, when there are some."""
+        self.stop_pondering()
+        self.stop_token.close()
+        if isinstance(self.transposition_table, SharedTranspositionTable):
+            self.transposition_table.close()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def log_infos(self, stats: SearchStats):
+        self.log('Search stats:', stats)
+        if self.use_search_cache or self.use_pv_cache:
+            self.log('Transposition table stats:', self.transposition_table.get_stats_str())
         if self.use_eval_cache:
-            print('Eval cache stats:', evaluation_cache.get_stats_str())
-        # print('Naive move priority order:', or) TODO
-        if self.use_pv_cache:
-            print('PV cache stats:', pv_cache.get_stats_str())
+            self.log('Eval cache stats:', evaluation_cache.get_stats_str())
+        # self.log('Naive move priority order:', or) TODO
 
-    def run_time_limited_search(self, alpha, beta, depth, best_move, best_eval, maxoul_board, end_time):
+    def run_time_limited_search(self, alpha, beta, depth, best_move, best_eval, maxoul_board, end_time, stats):
         search_t0 = time.time()
 
-        new_eval, new_best_move, search_cancelled = min_max_search(board=maxoul_board,
+        new_eval, new_best_move, search_cancelled = negamax_search(board=maxoul_board,
                                                                    depth=depth,
                                                                    alpha=alpha,
                                                                    beta=beta,
                                                                    maximizing_player=(
-                                                                           maxoul_board.board.turn == chess.WHITE),
+                                                                           maxoul_board.turn == chess.WHITE),
                                                                    capture_max_depth=self.capture_max_depth,
                                                                    pruning=self.pruning,
                                                                    candidate_best_move=best_move,
                                                                    max_end_time=end_time,
                                                                    use_search_cache=self.use_search_cache,
                                                                    use_eval_cache=self.use_eval_cache,
-                                                                   use_pv_cache=self.use_pv_cache
-                                                                   )
+                                                                   use_pv_cache=self.use_pv_cache,
+                                                                   tt=self.transposition_table,
+                                                                   heuristics=self.move_ordering,
+                                                                   executor=self.executor,
+                                                                   stats=stats,
+                                                                   null_move=self.null_move,
+                                                                   late_move_reductions=self.late_move_reductions,
+                                                                   stop_token=self.stop_token)
         search_duration = time.time() - search_t0
 
         # Case 1 cancelled: we cancel everything anyway, and keep current best move
@@ -129,85 +270,170 @@ class MaxoulBot:
 
         return new_best_move, new_eval, search_duration
 
-    def play_time_opt(self, board: chess.Board, time_limit):
+    def aspiration_search(self, depth, best_move, best_eval, maxoul_board, end_time, stats):
+        """
+        Search of depth with a window around the evaluation of the previous depth. When the score falls out of it,
+        only the side it failed on is widened, ASPIRATION_GROWTH times wider at each retry, and the depth is searched
+        again: the transposition table keeps the work of the failed searches. No retry once end_time is reached.
+        """
+        search_t0 = time.time()
+        lower_size = upper_size = self.aspiration_window_size(depth)
+        # No aspiration around a mate score: it moves by several plies from one depth to the next
+        if best_eval is None or plies_to_mate(best_eval) is not None:
+            lower_size = upper_size = float('inf')
+        white_to_move = maxoul_board.turn == chess.WHITE
+
+        while True:
+            alpha = best_eval - lower_size if lower_size < ASPIRATION_MAX_WINDOW else -float('inf')
+            beta = best_eval + upper_size if upper_size < ASPIRATION_MAX_WINDOW else float('inf')
+            new_best_move, new_eval, _ = self.run_time_limited_search(alpha,
+                                                                      beta,
+                                                                      depth=depth,
+                                                                      best_move=best_move,
+                                                                      best_eval=best_eval,
+                                                                      maxoul_board=maxoul_board,
+                                                                      end_time=end_time,
+                                                                      stats=stats)
+            if new_eval is None:
+                # Cancelled before any root move was searched: nothing better than the previous depth
+                return best_move, best_eval, time.time() - search_t0
+            if alpha < new_eval < beta:
+                self.log(f'Aspiration bullseye! got {new_eval:.2f}, within {alpha:.2f} {beta:.2f}!')
+                return new_best_move, new_eval, time.time() - search_t0
+            # Scores are from white's point of view: a fail low for white is a fail high for black
+            failed_low = new_eval <= alpha
+            fail_high = failed_low != white_to_move
+            fully_open = lower_size >= ASPIRATION_MAX_WINDOW and upper_size >= ASPIRATION_MAX_WINDOW
+            if stats.cancelled or time.time() >= end_time or fully_open:
+                # Out of time: after a fail low, the move of the previous depth is the safest one
+                if (not fail_high or new_best_move is None) and best_move is not None:
+                    return best_move, best_eval, time.time() - search_t0
+                return new_best_move, new_eval, time.time() - search_t0
+
+            stats.aspiration_researches += 1
+            if failed_low:
+                lower_size *= ASPIRATION_GROWTH
+            else:
+                upper_size *= ASPIRATION_GROWTH
+            if fail_high:
+                # The move which failed high is at least as good as the best one so far
+                if new_best_move is not None:
+                    best_move = new_best_move
+                stats.fail_highs += 1
+            else:
+                stats.fail_lows += 1
+            self.log(f'We missed: got {new_eval:.2f} not within {alpha:.2f} {beta:.2f}, widening')
+
+    def play_time_opt(self, board: chess.Board, time_limit, ponder: bool = None):
         """
         :param board:
         :param allowed_time: in seconds
+        :param ponder: whether to ponder once the move is found, self.ponder when None
         :return:
         """
-        allowed_time = self.time_allowance(board, time_limit)
-        end_time = time.time() + allowed_time
+        time_manager = self.time_manager(board, time_limit)
+        end_time = time_manager.hard_end_time
+
+        maxoul_board = BitboardChessBoard(board=board)
+        ponder_results = self.stop_pondering(maxoul_board.hash())
+        self.context.start_move(board)
+        if self.verbose:
+            self.log('Quiescence moves', get_quiescence_moves(maxoul_board))
+        stats = SearchStats()
 
-        maxoul_board = PythonChessBoard(board=board)
-        print('Quiescence moves', get_quiescence_moves(maxoul_board))
+        if self.lazy_smp is not None:
+            self.lazy_smp.start(board, self.max_depth, end_time, self.capture_max_depth, self.pruning,
+                                self.null_move, self.late_move_reductions)
 
         best_move = None
         best_evaluation = None
-
-        for depth in range(1, self.max_depth + 1):
+        completed_depth = 0
+        if ponder_results:
+            # Ponder hit: the depths already searched are not searched again
+            completed_depth, best_evaluation, best_move, _ = max(ponder_results, key=lambda result: result[0])
+            self.log(f'Ponder hit, depth {completed_depth} already done: {best_move} {best_evaluation:.2f}')
+        proven_result = self.context.proven_result(maxoul_board)
+        if proven_result is not None and proven_result[0] > completed_depth:
+            # Searched as part of the expected variation of our previous move
+            completed_depth, best_evaluation, best_move = proven_result
+            self.log(f'Depth {completed_depth} already proven: {best_move} {best_evaluation:.2f}')
+
+        for depth in range(completed_depth + 1, self.max_depth + 1):
             remaining_allowed_time = max(end_time - time.time(), 0)
-            if remaining_allowed_time == 0:
-                print('stopping, time ellapsed')
+            if remaining_allowed_time == 0 or self.stop_token.is_set():
+                self.log('stopping, time ellapsed')
                 break
 
-            alpha = -float('inf')
-            beta = float('inf')
-            window_size = self.aspiration_window_size(depth)
-            if best_evaluation is not None:
-                alpha = best_evaluation - window_size
-                beta = best_evaluation + window_size
-
-            new_best_move, new_eval, search_duration = self.run_time_limited_search(alpha,
-                                                                                    beta,
-                                                                                    depth=depth,
-                                                                                    best_move=best_move,
-                                                                                    best_eval=best_evaluation,
-                                                                                    maxoul_board=maxoul_board,
-                                                                                    end_time=end_time)
-
-            # Case 1: we are in the window: let's rolll
-            if alpha <= new_eval <= beta:
-                print(f'Aspiration bullseye! got {new_eval:.2f}, within {alpha:.2f} {beta:.2f}!')
-                best_move = new_best_move
-                best_evaluation = new_eval
-
-            # Case 2: We missed the window: we launch again
-            else:
-                print(f'We missed: got {new_eval:.5f} not within {alpha:.5f} {beta:.5f}! launching again with infty')
+            # Cutoffs of the previous iteration are still a good guess, but weigh less than the coming ones
+            self.move_ordering.age()
 
-                best_move, best_evaluation, search_duration = self.run_time_limited_search(alpha=-float('inf'),
-                                                                                           beta=float('inf'),
-                                                                                           depth=depth,
-                                                                                           best_move=best_move,
-                                                                                           best_eval=best_evaluation,
-                                                                                           maxoul_board=maxoul_board,
-                                                                                           end_time=end_time)
+            depth_t0 = time.time()
+            depth_nodes = stats.nodes + stats.q_nodes
+            stats.root_move_nodes.clear()
 
-            remaining_allowed_time = max(end_time - time.time(), 0)
+            best_move, best_evaluation, search_duration = self.aspiration_search(depth,
+                                                                                 best_move=best_move,
+                                                                                 best_eval=best_evaluation,
+                                                                                 maxoul_board=maxoul_board,
+                                                                                 end_time=end_time,
+                                                                                 stats=stats)
+
+            stats.record_depth(depth, time.time() - depth_t0, stats.nodes + stats.q_nodes - depth_nodes)
+            if stats.cancelled:
+                self.log(f'Depth {depth} cut by the hard limit, current best move {best_move}')
+                break
+            completed_depth = depth
+            time_manager.update(best_move, stats.best_move_effort(best_move))
 
-            print(f"Depth {depth} done, remaining time {remaining_allowed_time:.2f} "
-                  f"current best move {best_move} and eval {best_evaluation:.2f}")
+            self.log(f"Depth {depth} done in {search_duration:.2f}s, {time_manager}, "
+                     f"current best move {best_move} and eval {best_evaluation:.2f}")
+
+            if time_manager.should_stop(search_duration):
+                self.log('Stopping, not enough left for next depth')
+                break
 
-            if 2 * search_duration > remaining_allowed_time:
-                print('Stopping, not enough left for next depth')
+            # A forced mate for us within the searched depth: searching deeper would not change the move
+            mate_plies = None if best_evaluation is None else plies_to_mate(best_evaluation)
+            if mate_plies is not None and mate_plies <= depth and (best_evaluation > 0) == (board.turn == chess.WHITE):
+                self.log(f'Mate in {(mate_plies + 1) // 2} found')
                 break
 
+        if self.lazy_smp is not None:
+            # A helper may have completed a deeper search than the main one
+            for helper_depth, helper_eval, helper_move, helper_index in self.lazy_smp.stop():
+                if helper_depth > completed_depth:
+                    self.log(f'Using helper {helper_index} result at depth {helper_depth}')
+                    completed_depth, best_evaluation, best_move = helper_depth, helper_eval, helper_move
+
         if best_move is None:
             best_move = random.choice(list(board.legal_moves))
+        # Set at the deadline, or by a stop: the next move starts afresh
+        self.stop_token.clear()
+
+        stats.stop()
+        stats.info = dict(fen=board.fen(), move=best_move.uci(), evaluation=best_evaluation, depth=completed_depth,
+                          soft_limit=round(time_manager.soft_limit, 3), hard_limit=round(time_manager.hard_limit, 3),
+                          time_scale=round(time_manager.scale, 3))
+        self.last_stats = stats
+        if self.stats_sink is not None:
+            self.stats_sink(stats)
+
+        self.log('')
+        self.log(f'Selected move {best_move} evaluation {best_evaluation:.2f}')
+        self.log_infos(stats)
+
+        self.context.end_move(board, maxoul_board, best_move)
+        self.log('Expected variation:', ' '.join(move.uci() for move in self.context.expected_pv))
 
-        print('')
-        print(f'Selected move {best_move} evaluation {best_evaluation:.2f}')
-        self.log_infos()
+        if self.ponder if ponder is None else ponder:
+            self.start_pondering(board, best_move)
 
         return best_move
 
 
-bot = MaxoulBot(max_depth=10,
-                capture_max_depth=4,
-                pruning=True,
-                use_search_cache=False,
-                use_eval_cache=False,
-                use_pv_cache=False)
+# Created by the first call of play: importing the module, e.g. in the game server workers, must not allocate the
+# shared memory of a pondering bot
+bot: Optional[MaxoulBot] = None
 
 
 def play(board: chess.Board,
@@ -215,7 +441,17 @@ def play(board: chess.Board,
          ponder,
          draw_offered,
          root_moves):
-    return bot.play_time_opt(board, time_limit=time_limit)
+    global bot
+    if bot is None:
+        bot = MaxoulBot(max_depth=10,
+                        capture_max_depth=6,
+                        pruning=True,
+                        use_search_cache=True,
+                        use_eval_cache=False,
+                        use_pv_cache=False,
+                        tt_mb=64,
+                        ponder=True)
+    return bot.play_time_opt(board, time_limit=time_limit, ponder=bool(ponder))
 
 
 if __name__ == '__main__':
@@ -1,32 +1,49 @@
 from maxoul_chess.abstract_board import AbstractBoard
 from maxoul_chess.python_chess_board import PythonChessBoard
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard, unpack_score
 import chess
-from maxoul_chess.piece_position_values import square_set_to_value, piece_raw_values_typed, initial_non_pawn_material
+import numpy as np
+from beartype.typing import Sequence
+from maxoul_chess.piece_position_values import pst_index, pst_beginning, pst_endgame, piece_raw_values_typed, \
+    initial_non_pawn_material, batch_piece_indices, batch_non_pawn_values, batch_beginning_tables, batch_endgame_tables
 
-from maxoul_chess.utils import LimitedHashTable
+from maxoul_chess.transposition_table import ScoreTable
 
-evaluation_cache = LimitedHashTable(max_size=1e8)
+evaluation_cache = ScoreTable(size_mb=64)
 
+# Score of a checkmate. The search returns MATE_SCORE - n for a mate delivered n plies from its root
+MATE_SCORE = 1000000
 
-def evaluate(board: PythonChessBoard, z_hash: str, use_cache: bool = False):
-    if use_cache:
-        assert z_hash is not None
-        out = evaluation_cache.get(z_hash)
-        if out is not None:
-            return out
 
+def evaluate(board: AbstractBoard, z_hash: int, use_cache: bool = False):
     if board.is_checkmate():
         winner = board.winner()
         if winner == chess.WHITE:
-            return 1000000
+            return MATE_SCORE
         else:
-            return -1000000
+            return -MATE_SCORE
 
     if board.is_stalemate() or board.is_insufficient_material() \
-            or board.is_fifty_moves() or board.board.is_repetition():
+            or board.is_fifty_moves() or board.is_repetition():
         return 0
 
-    material_evaluation = evaluate_material(board)
+    return evaluate_static(board, z_hash, use_cache=use_cache)
+
+
+def evaluate_static(board: AbstractBoard, z_hash: int, use_cache: bool = False):
+    """
+    Evaluation of the pieces only, without checking whether the game is over.
+    """
+    if use_cache:
+        assert z_hash is not None
+        out = evaluation_cache.get(z_hash)
+        if out is not None:
+            return out
+
+    if isinstance(board, BitboardChessBoard):
+        material_evaluation = evaluate_material_incremental(board)
+    else:
+        material_evaluation = evaluate_material(board)
 
     # castle_evaluation = evaluate_castle(board)
 
@@ -50,8 +67,8 @@ def evaluate(board: PythonChessBoard, z_hash: str, use_cache: bool = False):
 #     raise ValueError
 
 
-def evaluate_material(board: PythonChessBoard, verbose=False):
-    assert isinstance(board, PythonChessBoard)
+def evaluate_material(board: AbstractBoard, verbose=False):
+    assert isinstance(board, AbstractBoard)
     pawn_raw_white, pawn_beg_white, pawn_end_white = piece_evaluation(board, chess.PAWN, chess.WHITE, verbose=verbose)
     pawn_raw_black, pawn_beg_black, pawn_end_black = piece_evaluation(board, chess.PAWN, chess.BLACK, verbose=verbose)
 
@@ -105,11 +122,56 @@ def evaluate_material(board: PythonChessBoard, verbose=False):
     return white_raw_eval + white_pst_eval - black_raw_eval - black_pst_eval
 
 
+def evaluate_material_incremental(board: BitboardChessBoard):
+    """
+    Same value as evaluate_material, read in O(1) from the accumulators the board maintains in push/pop.
+    """
+    end_coeff = 1 - board.non_pawn_material / initial_non_pawn_material
+    end_coeff = min(1, end_coeff)
+    end_coeff = max(0, end_coeff)
+    beg_coeff = 1 - end_coeff
+    # Raw material is folded in both parts of the packed score, since beg_coeff + end_coeff = 1
+    beginning_score, endgame_score = unpack_score(board.score)
+    return beg_coeff * beginning_score + end_coeff * endgame_score
+
+
+def boards_to_bitboards(boards: Sequence[AbstractBoard]) -> np.ndarray:
+    """(N, 12) array with the bitboard of each (color, piece type) of each board, in the batch table order."""
+    return np.array([[board.pieces_mask(piece_type, color) for color, piece_type in batch_piece_indices]
+                     for board in boards], dtype=np.uint64).reshape(len(boards), 12)
+
+
+def bitboards_to_occupancy(bitboards: np.ndarray) -> np.ndarray:
+    """(N, 12) bitboards to the (N, 12, 64) occupancy array, square 0 first."""
+    as_bytes = bitboards.astype('<u8').view(np.uint8).reshape(len(bitboards), 12, 8)
+    return np.unpackbits(as_bytes, axis=2, bitorder='little')
+
+
+def evaluate_batch(boards: Sequence[AbstractBoard] = None, bitboards: np.ndarray = None) -> np.ndarray:
+    """
+    evaluate_static of many positions at once, from white's point of view: material, game phase and tapered piece
+    square tables computed with array operations over all the positions. The positions are given as boards or as
+    the (N, 12) array of boards_to_bitboards.
+    """
+    if bitboards is None:
+        bitboards = boards_to_bitboards(boards)
+    occupancy = bitboards_to_occupancy(bitboards).astype(np.float64)
+    non_pawn_material = occupancy.sum(axis=2) @ batch_non_pawn_values
+    end_coeff = np.clip(1 - non_pawn_material / initial_non_pawn_material, 0, 1)
+    beginning_score = np.einsum('nps,ps->n', occupancy, batch_beginning_tables)
+    endgame_score = np.einsum('nps,ps->n', occupancy, batch_endgame_tables)
+    return (1 - end_coeff) * beginning_score + end_coeff * endgame_score
+
+
 def piece_evaluation(board, piece, color, verbose: bool = False):
-    pieces = board.board.pieces(piece, color)
+    pieces = board.pieces(piece, color)
     raw_piece_evaluation = piece_raw_values_typed[piece] * len(pieces)
-    pst_piece_evaluation_beginning = square_set_to_value(pieces, 'beginning', piece, color)
-    pst_piece_evaluation_endgame = square_set_to_value(pieces, 'endgame', piece, color)
+    offset = pst_index(piece, color)
+    pst_piece_evaluation_beginning = 0
+    pst_piece_evaluation_endgame = 0
+    for square in pieces:
+        pst_piece_evaluation_beginning += pst_beginning[offset + square]
+        pst_piece_evaluation_endgame += pst_endgame[offset + square]
     if verbose:
         print(f"piece {piece}, color {color}, raw eval {raw_piece_evaluation} "
               f"beg eval {pst_piece_evaluation_beginning} end eval {pst_piece_evaluation_endgame}")
@@ -0,0 +1,253 @@
+"""
+Multi-game server: one process hosting many bot games at the same time.
+
+The searches run in a bounded set of worker processes. Each game is pinned to one worker, which keeps the MaxoulBot
+of the game (transposition table, move ordering heuristics) from one move to the next. The evaluation cache stays a
+global of each worker process: it only depends on the position, so games sharing it is harmless.
+Each game has a shared stop token: ending a game stops its search in progress, which answers at once with the best
+move found so far.
+The front end is an asyncio server reading JSON lines, one request per line:
+    {"id": 1, "type": "move", "game_id": "abc", "initial_fen": ..., "moves": ["e2e4", ...],
+     "white_clock": 180, "black_clock": 180, "white_inc": 2, "black_inc": 2}  ->  {"id": 1, "move": "e7e5"}
+    {"id": 2, "type": "end", "game_id": "abc"}  ->  {"id": 2, "ended": true}
+Requests of one connection are served concurrently, responses come back in completion order with the request id.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import chess
+from beartype.typing import Dict, List, Optional
+from chess import Move
+from maxoul_chess.bot import MaxoulBot
+from maxoul_chess.stop_token import StopToken
+
+DEFAULT_BOT_OPTIONS = dict(max_depth=10, capture_max_depth=6, use_search_cache=True, use_pv_cache=False, tt_mb=16,
+                           verbose=False)
+
+
+class TimeLimit:
+    """Clocks of a game in seconds, with the attributes MaxoulBot.time_allowance reads."""
+    def __init__(self, white_clock: float = None, black_clock: float = None,
+                 white_inc: float = None, black_inc: float = None):
+        self.white_clock = white_clock
+        self.black_clock = black_clock
+        self.white_inc = white_inc
+        self.black_inc = black_inc
+
+    def __repr__(self):
+        return f'TimeLimit({self.white_clock}, {self.black_clock}, {self.white_inc}, {self.black_inc})'
+
+
+# Bots of the games pinned to this worker process
+games: Dict[str, MaxoulBot] = {}
+
+
+def play_game_move(game_id: str, board: chess.Board, time_limit: TimeLimit, submit_time: float,
+                   bot_options: dict, stop_token: StopToken = None) -> str:
+    """Runs in the worker process of the game."""
+    # The time spent waiting for the worker comes out of the clock of the side to move
+    waited = time.time() - submit_time
+    if board.turn == chess.WHITE and time_limit.white_clock is not None:
+        time_limit.white_clock = max(time_limit.white_clock - waited, 0.1)
+    elif board.turn == chess.BLACK and time_limit.black_clock is not None:
+        time_limit.black_clock = max(time_limit.black_clock - waited, 0.1)
+
+    if game_id not in games:
+        games[game_id] = MaxoulBot(stop_token=stop_token, **bot_options)
+    return games[game_id].play_time_opt(board, time_limit).uci()
+
+
+def end_game(game_id: str) -> bool:
+    """Runs in the worker process of the game, frees its bot."""
+    bot = games.pop(game_id, None)
+    if bot is None:
+        return False
+    bot.close()
+    return True
+
+
+class GameManager:
+    """
+    Schedules the searches of all the games over n_workers processes, each new game going to the least loaded one.
+    """
+    def __init__(self, n_workers: int = None, bot_options: dict = None):
+        if n_workers is None:
+            n_workers = os.cpu_count()
+        self.bot_options = DEFAULT_BOT_OPTIONS if bot_options is None else bot_options
+        self.workers = [ProcessPoolExecutor(max_workers=1) for _ in range(n_workers)]
+        self.game_workers = {}
+        self.n_games = [0] * n_workers
+        self.stop_tokens: Dict[str, StopToken] = {}
+
+    def worker_index(self, game_id: str) -> int:
+        if game_id not in self.game_workers:
+            index = self.n_games.index(min(self.n_games))
+            self.game_workers[game_id] = index
+            self.n_games[index] += 1
+        return self.game_workers[game_id]
+
+    async def request_move(self, game_id: str, board: chess.Board, time_limit: TimeLimit) -> Move:
+        worker = self.workers[self.worker_index(game_id)]
+        if game_id not in self.stop_tokens:
+            self.stop_tokens[game_id] = StopToken(shared=True)
+        loop = asyncio.get_running_loop()
+        uci = await loop.run_in_executor(worker, play_game_move, game_id, board, time_limit, time.time(),
+                                         self.bot_options, self.stop_tokens[game_id])
+        return Move.from_uci(uci)
+
+    async def end_game(self, game_id: str) -> bool:
+        if game_id not in self.game_workers:
+            return False
+        index = self.game_workers.pop(game_id)
+        self.n_games[index] -= 1
+        # A search of the game in progress answers right away, the worker is then free to end the game
+        stop_token = self.stop_tokens.pop(game_id, None)
+        if stop_token is not None:
+            stop_token.set()
+        loop = asyncio.get_running_loop()
+        ended = await loop.run_in_executor(self.workers[index], end_game, game_id)
+        if stop_token is not None:
+            stop_token.close()
+        return ended
+
+    def shutdown(self):
+        for stop_token in self.stop_tokens.values():
+            stop_token.set()
+        for worker in self.workers:
+            worker.shutdown(cancel_futures=True)
+        for stop_token in self.stop_tokens.values():
+            stop_token.close()
+        self.stop_tokens = {}
+
+
+class GameServer:
+    def __init__(self, manager: GameManager, host: str = '127.0.0.1', port: int = 0, verbose: bool = False):
+        """
+        :param port: 0 picks a free port, available in self.port once started.
+        :param verbose: print the address once listening. The server does not print anything otherwise.
+        """
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.verbose = verbose
+        self.server = None
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.log(f'Game server listening on {self.host}:{self.port}')
+        return self.port
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        tasks = set()
+
+        async def answer(line):
+            response = await self.handle_request(line)
+            writer.write((json.dumps(response) + '\n').encode())
+            await writer.drain()
+
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            task = asyncio.create_task(answer(line))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+        writer.close()
+
+    async def handle_request(self, line: bytes) -> dict:
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get('id')
+            game_id = str(request['game_id'])
+            if request['type'] == 'move':
+                board = chess.Board(request.get('initial_fen') or chess.STARTING_FEN)
+                for uci in request.get('moves', []):
+                    board.push_uci(uci)
+                time_limit = TimeLimit(request.get('white_clock'), request.get('black_clock'),
+                                       request.get('white_inc'), request.get('black_inc'))
+                move = await self.manager.request_move(game_id, board, time_limit)
+                return {'id': request_id, 'game_id': game_id, 'move': move.uci()}
+            elif request['type'] == 'end':
+                return {'id': request_id, 'game_id': game_id, 'ended': await self.manager.end_game(game_id)}
+            raise ValueError(f"Unknown request type {request['type']}")
+        except Exception as error:
+            return {'id': request_id, 'error': f'{type(error).__name__}: {error}'}
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+class StubClient:
+    """
+    Local client of the game server, to drive it in tests: requests can be awaited concurrently on one connection.
+    """
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.pending = {}
+        self.next_id = 0
+        self.read_task = None
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.read_task = asyncio.create_task(self.read_responses())
+
+    async def read_responses(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            self.pending.pop(response['id']).set_result(response)
+
+    async def send(self, request: dict) -> dict:
+        self.next_id += 1
+        request['id'] = self.next_id
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.next_id] = future
+        self.writer.write((json.dumps(request) + '\n').encode())
+        await self.writer.drain()
+        response = await future
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response
+
+    async def request_move(self, game_id: str, moves: List[str], initial_fen: Optional[str] = None,
+                           white_clock: float = None, black_clock: float = None,
+                           white_inc: float = None, black_inc: float = None) -> str:
+        response = await self.send({'type': 'move', 'game_id': game_id, 'initial_fen': initial_fen, 'moves': moves,
+                                    'white_clock': white_clock, 'black_clock': black_clock,
+                                    'white_inc': white_inc, 'black_inc': black_inc})
+        return response['move']
+
+    async def end_game(self, game_id: str) -> bool:
+        return (await self.send({'type': 'end', 'game_id': game_id}))['ended']
+
+    async def close(self):
+        self.writer.close()
+        await self.read_task
+
+
+async def serve(host: str = '127.0.0.1', port: int = 8765, n_workers: int = None):
+    manager = GameManager(n_workers=n_workers)
+    server = GameServer(manager, host=host, port=port, verbose=True)
+    await server.start()
+    try:
+        await server.server.serve_forever()
+    finally:
+        manager.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve())
@@ -0,0 +1,172 @@
+"""
+Lazy SMP: helper processes search the same root position as the main search, at the same time, all of them sharing
+one transposition table. Nothing else is shared: the helpers fill the table with entries the other searches then
+find, and the deepest result completed by any process before the deadline is played.
+"""
+import multiprocessing
+import queue
+import time
+import chess
+from beartype.typing import List, Tuple
+from chess import Move
+from maxoul_chess.negamax import negamax_search
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.legal_moves_generation import MoveOrderingHeuristics
+from maxoul_chess.transposition_table import SharedTranspositionTable
+from maxoul_chess.stop_token import StopToken
+
+# Seconds given to the helpers to return once stopped, before they are killed
+HELPER_STOP_TIMEOUT = 0.5
+
+
+def helper_search(helper_index: int,
+                  board: chess.Board,
+                  tt_name: str,
+                  tt_mb: float,
+                  tt_age: int,
+                  max_depth: int,
+                  end_time: float,
+                  capture_max_depth: int,
+                  pruning: bool,
+                  null_move: bool,
+                  late_move_reductions: bool,
+                  results,
+                  stop_token: StopToken) -> None:
+    """
+    Iterative deepening of a helper process. Half of the helpers start one depth further, so that the processes are
+    not all working on the same depth. Each completed depth is sent to results as (depth, score, move, helper_index).
+    stop_token: shared, set by LazySMP.stop: the search in progress unwinds and the helper returns.
+    """
+    tt = SharedTranspositionTable(tt_mb, name=tt_name)
+    tt.age = tt_age
+    maxoul_board = BitboardChessBoard(board=board)
+    heuristics = MoveOrderingHeuristics()
+
+    best_move = None
+    for depth in range(1 + helper_index % 2, max_depth + 1):
+        if stop_token.is_set() or time.time() > end_time:
+            break
+        heuristics.age()
+        score, move, search_cancelled = negamax_search(maxoul_board,
+                                                       depth=depth,
+                                                       maximizing_player=(maxoul_board.turn == chess.WHITE),
+                                                       capture_max_depth=capture_max_depth,
+                                                       pruning=pruning,
+                                                       candidate_best_move=best_move,
+                                                       max_end_time=end_time,
+                                                       use_search_cache=True,
+                                                       use_pv_cache=True,
+                                                       tt=tt,
+                                                       heuristics=heuristics,
+                                                       null_move=null_move,
+                                                       late_move_reductions=late_move_reductions,
+                                                       stop_token=stop_token)
+        if search_cancelled or move is None:
+            break
+        best_move = move
+        results.put((depth, score, move, helper_index))
+    tt.close()
+
+
+class LazySMP:
+    """
+    The helper processes of the current move, searching with the given shared transposition table.
+    """
+    def __init__(self, n_helpers: int, tt: SharedTranspositionTable):
+        self.n_helpers = n_helpers
+        self.tt = tt
+        self.processes = []
+        self.results = None
+        self.stop_token = StopToken(shared=True)
+
+    def start(self, board: chess.Board, max_depth: int, end_time: float, capture_max_depth: int, pruning: bool,
+              null_move: bool = False, late_move_reductions: bool = False):
+        self.results = multiprocessing.Queue()
+        self.stop_token.clear()
+        self.processes = []
+        for helper_index in range(self.n_helpers):
+            process = multiprocessing.Process(target=helper_search,
+                                              args=(helper_index, board, self.tt.name, self.tt.size_mb,
+                                                    self.tt.age, max_depth, end_time, capture_max_depth, pruning,
+                                                    null_move, late_move_reductions, self.results, self.stop_token),
+                                              daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    def collect(self) -> List[Tuple[int, float, Move, int]]:
+        """Results sent by the helpers so far, as (depth, score from white's point of view, move, helper index)."""
+        out = []
+        while True:
+            try:
+                out.append(self.results.get_nowait())
+            except queue.Empty:
+                return out
+
+    def stop(self) -> List[Tuple[int, float, Move, int]]:
+        """Stops the helpers and returns all their results."""
+        self.stop_token.set()
+        # The search of each helper unwinds at its next node. One still running after HELPER_STOP_TIMEOUT is killed:
+        # the table stays consistent whenever a process dies during a write
+        for process in self.processes:
+            process.join(HELPER_STOP_TIMEOUT)
+        out = self.collect()
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.processes = []
+        return out
+
+
+def time_to_depth(fen: str, depth: int, n_workers: int, capture_max_depth: int = 2, tt_mb: float = 16) -> float:
+    """
+    Seconds until a search of depth is completed by any of the n_workers processes (the main one included).
+    """
+    board = chess.Board(fen)
+    tt = SharedTranspositionTable(tt_mb)
+    lazy_smp = LazySMP(n_workers - 1, tt)
+    t0 = time.time()
+    end_time = t0 + 3600
+    lazy_smp.start(board, depth, end_time, capture_max_depth, pruning=True)
+
+    maxoul_board = BitboardChessBoard(board=board)
+    heuristics = MoveOrderingHeuristics()
+    best_move = None
+    duration = None
+    for current_depth in range(1, depth + 1):
+        heuristics.age()
+        best_move = negamax_search(maxoul_board,
+                                   depth=current_depth,
+                                   maximizing_player=(maxoul_board.turn == chess.WHITE),
+                                   capture_max_depth=capture_max_depth,
+                                   candidate_best_move=best_move,
+                                   max_end_time=end_time,
+                                   use_search_cache=True,
+                                   use_pv_cache=True,
+                                   tt=tt,
+                                   heuristics=heuristics)[1]
+        if any(result[0] >= depth for result in lazy_smp.collect()):
+            duration = time.time() - t0
+            break
+    if duration is None:
+        duration = time.time() - t0
+    lazy_smp.stop()
+    tt.close()
+    return duration
+
+
+if __name__ == '__main__':
+    # Time-to-depth speedup against worker count
+    fens = ['r2qkb1r/pp3ppp/2n1bn2/1Bp1N3/4P3/2N5/PPPP2PP/R1BQ1RK1 b kq - 0 8',
+            'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+            '2k2r2/R7/3b4/1R6/n5N1/5PP1/P4PK1/3r4 b - - 2 45']
+    depth = 5
+    print(f'{multiprocessing.cpu_count()} cores, time to depth {depth}')
+    reference_time = None
+    for n_workers in [1, 2, 4, 8, 16]:
+        if n_workers > 2 * multiprocessing.cpu_count():
+            break
+        total_time = sum(time_to_depth(fen, depth, n_workers) for fen in fens)
+        if reference_time is None:
+            reference_time = total_time
+        print(f'{n_workers} workers: {total_time:.2f}s, speedup {reference_time / total_time:.2f}')
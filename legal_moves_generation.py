@@ -1,46 +1,62 @@
-from beartype.typing import List
-import numpy as np
+from array import array
+from beartype.typing import List, Iterator, Sequence
 import chess
+import numpy as np
 from chess import Move
-from maxoul_chess.piece_position_values import piece_raw_values_typed
+from maxoul_chess.piece_position_values import piece_raw_values_typed, batch_piece_indices
 from maxoul_chess.abstract_board import AbstractBoard
-from maxoul_chess.evaluation import evaluate
+from maxoul_chess.evaluation import evaluate, evaluate_batch
 
 
 def move_priority_bis(move: Move, board: AbstractBoard) -> float:
     board.push(move)
     priority = evaluate(board, z_hash=None, use_cache=False)
     board.pop()
-    if board.board.turn == chess.BLACK:
+    if board.turn == chess.BLACK:
         priority = -priority
     return priority
 
 
+def move_priorities_batch(moves: Sequence[Move], board: AbstractBoard) -> List[float]:
+    """
+    Static evaluation of the position after each move, from the point of view of the side to move, all children
+    evaluated in one evaluate_batch call. Unlike move_priority_bis, checkmates and draws are not detected.
+    """
+    children = []
+    for move in moves:
+        board.push(move)
+        children.append([board.pieces_mask(piece_type, color) for color, piece_type in batch_piece_indices])
+        board.pop()
+    if not children:
+        return []
+    priorities = evaluate_batch(bitboards=np.array(children, dtype=np.uint64))
+    if board.turn == chess.BLACK:
+        priorities = -priorities
+    return priorities.tolist()
+
+
 def get_quiescence_moves(board: AbstractBoard):
     # Firt case: we are not in check
-    if not board.board.is_check():
-        out = []
-        priorities = []
-        for move in board.generate_legal_moves():
-            # if board.gives_check(move):  # Keeping checks:
-            #     out.append(move)
-            #     priorities.append(500)
-            if move.promotion is not None and move.promotion == chess.QUEEN:  # Keeping queening
-                out.append(move)
-                priorities.append(400)
-            elif board.is_capture(move):  # Capture of non-pawns
-                origin_piece = board.piece_at(move.from_square).piece_type
-                destination_piece = board.piece_at(move.to_square)
-                origin_price = piece_raw_values_typed[origin_piece]
-
-                if destination_piece is not None:  # because of en passant
-                    destination_piece = destination_piece.piece_type
-                    dest_price = piece_raw_values_typed[destination_piece]
-                    if dest_price >= 300 and dest_price - origin_price >= -20:
-                        out.append(move)
-                        priorities.append(dest_price - origin_price)
-        out_sorted = [out[i] for i in np.argsort(-1. * np.array(priorities))]
-        return out_sorted
+    if not board.is_check():
+        # Captures which do not lose material according to the static exchange evaluation, best ones first
+        scored_moves = []
+        for move in board.generate_capture_moves():
+            if move.promotion is not None and move.promotion != chess.QUEEN:
+                continue
+            exchange_score = see(board, move)
+            if exchange_score >= 0:
+                scored_moves.append((exchange_score, mvv_lva(move, board), move))
+
+        # Keeping queening
+        if board.pieces_mask(chess.PAWN, board.turn) & (chess.BB_RANK_7 if board.turn else chess.BB_RANK_2):
+            for move in board.generate_quiet_moves():
+                if move.promotion == chess.QUEEN:
+                    exchange_score = see(board, move)
+                    if exchange_score >= 0:
+                        scored_moves.append((exchange_score, 0, move))
+
+        scored_moves.sort(key=lambda scored_move: scored_move[:2], reverse=True)
+        return [move for _, _, move in scored_moves]
     else:
         # Sorted ways to avoid the check !
         return order_moves(board.generate_legal_moves(), board)
@@ -92,9 +108,9 @@ def move_priority(move: Move, board: AbstractBoard) -> int:
 
     # Mettre une pièce en prise d'un pion n'est pas bon (si ce n'est pas une capture!)
     elif origin_piece != chess.PAWN and origin_piece != chess.KING:
-        dest_square_attackers = board.board.attackers(not board.board.turn, destination_square)
+        dest_square_attackers = board.attackers(not board.turn, destination_square)
         for elt in dest_square_attackers:
-            if board.board.piece_type_at(elt) == chess.PAWN:
+            if board.piece_type_at(elt) == chess.PAWN:
                 return -1000  # Not a good idea in general !
 
     return out
@@ -121,9 +137,9 @@ def move_priority_ter(move: Move, board: AbstractBoard) -> int:
         priority += piece_raw_values_typed[move.promotion]
 
     if origin_piece != chess.PAWN and origin_piece != chess.KING:
-        dest_square_attackers = board.board.attackers(not board.board.turn, destination_square)
+        dest_square_attackers = board.attackers(not board.turn, destination_square)
         for elt in dest_square_attackers:
-            if board.board.piece_type_at(elt) == chess.PAWN:
+            if board.piece_type_at(elt) == chess.PAWN:
                 priority -= piece_raw_values_typed[origin_piece]
                 break
 
@@ -145,3 +161,182 @@ def order_moves(moves: List[Move],
         sorted_moves = sorted(moves, key=lambda move: selected_move_priority(move, board), reverse=True)
 
     return sorted_moves
+
+
+class MoveOrderingHeuristics:
+    """
+    Killer moves (two quiet moves per ply which produced a beta cutoff) and history scores (per from/to squares,
+    increased by depth^2 on each beta cutoff of a quiet move), used to order the quiet moves.
+    """
+    max_ply = 128
+
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(self.max_ply)]
+        self.history = array('q', bytes(8 * 64 * 64))
+
+    def update(self, move: Move, ply: int, depth: int) -> None:
+        """To be called when a quiet move produces a beta cutoff."""
+        if ply < self.max_ply:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        self.history[move.from_square * 64 + move.to_square] += depth * depth
+
+    def get_killers(self, ply: int) -> List[Move]:
+        return self.killers[ply] if ply < self.max_ply else []
+
+    def history_score(self, move: Move) -> int:
+        return self.history[move.from_square * 64 + move.to_square]
+
+    def shift(self, n_plies: int) -> None:
+        """The root moved n_plies further in the game: the killers of ply p now belong to ply p - n_plies."""
+        n_plies = min(n_plies, self.max_ply)
+        self.killers = self.killers[n_plies:] + [[None, None] for _ in range(n_plies)]
+
+    def age(self) -> None:
+        """Between iterations: older cutoffs weigh less than the ones of the next search."""
+        history = self.history
+        for index in range(len(history)):
+            history[index] >>= 1
+
+    def clear(self) -> None:
+        self.killers = [[None, None] for _ in range(self.max_ply)]
+        self.history = array('q', bytes(8 * 64 * 64))
+
+
+def quiet_move_priority(move: Move) -> int:
+    """Static part of the order of the quiet moves: promotions first."""
+    return 0 if move.promotion is None else piece_raw_values_typed[move.promotion]
+
+
+def mvv_lva(move: Move, board: AbstractBoard) -> int:
+    """Most valuable victim, least valuable attacker: the score of a capture for ordering purposes."""
+    victim = board.piece_type_at(move.to_square) or chess.PAWN  # en passant
+    attacker = board.piece_type_at(move.from_square)
+    return 10 * piece_raw_values_typed[victim] - piece_raw_values_typed[attacker]
+
+
+# Piece values for the exchanges: the king can take part in an exchange but is never captured
+see_values = {**piece_raw_values_typed, chess.KING: 20000}
+
+
+def see(board: AbstractBoard, move: Move) -> int:
+    """
+    Static exchange evaluation: material won by the side to move when playing move, assuming both sides then keep
+    recapturing on the destination square with their least valuable piece and may stop whenever it suits them.
+    Pieces hidden behind a capturer (x-rays) join the exchange once the capturer has left. Pins are ignored.
+    """
+    from_square = move.from_square
+    to_square = move.to_square
+    attacker = board.piece_type_at(from_square)
+    victim = board.piece_type_at(to_square)
+    occupied = board.occupied_mask() & ~chess.BB_SQUARES[from_square]
+
+    if victim is not None:
+        gain = see_values[victim]
+    elif attacker == chess.PAWN and chess.square_file(from_square) != chess.square_file(to_square):  # en passant
+        gain = see_values[chess.PAWN]
+        occupied &= ~chess.BB_SQUARES[chess.square(chess.square_file(to_square), chess.square_rank(from_square))]
+    else:
+        gain = 0
+    value_on_square = see_values[attacker]
+    if move.promotion is not None:
+        gain += see_values[move.promotion] - see_values[chess.PAWN]
+        value_on_square = see_values[move.promotion]
+
+    # gains[i]: material won by the side making the i-th capture if the exchange stopped right after it
+    gains = [gain]
+    color = not board.turn
+    while True:
+        # Masking with occupied removes the pieces which already took part in the exchange
+        attackers = board.attackers_mask(color, to_square, occupied) & occupied
+        if not attackers:
+            break
+        for piece_type in (chess.PAWN, chess.KNIGHT, chess.BISHOP, chess.ROOK, chess.QUEEN, chess.KING):
+            candidates = attackers & board.pieces_mask(piece_type, color)
+            if candidates:
+                break
+        if piece_type == chess.KING and board.attackers_mask(not color, to_square, occupied) & occupied:
+            break  # The king cannot capture a defended piece
+        gains.append(value_on_square - gains[-1])
+        value_on_square = see_values[piece_type]
+        occupied &= ~(candidates & -candidates)
+        color = not color
+
+    # Each side only captures when it does not make it worse than stopping there
+    for i in range(len(gains) - 1, 0, -1):
+        gains[i - 1] = -max(-gains[i - 1], gains[i])
+    return gains[0]
+
+
+def pick_moves(board: AbstractBoard,
+               hash_move: Move = None,
+               killers: Sequence[Move] = (),
+               heuristics: MoveOrderingHeuristics = None) -> Iterator[Move]:
+    """
+    Staged move ordering: hash move, winning captures (MVV-LVA), killers, quiet moves (by history score when
+    heuristics are given), losing captures (by static exchange evaluation).
+    Each stage is only generated when the previous ones are exhausted, so a cutoff on the hash move only costs the
+    generation of its own stage, needed anyway to check that it is legal: a key collision in the transposition table
+    can give the move of another position. The board must be back to the same position each time the generator is
+    resumed.
+    """
+    capture_moves = None
+    quiet_moves = None
+    if hash_move is not None:
+        if board.is_capture(hash_move):
+            capture_moves = board.generate_capture_moves()
+            is_legal = hash_move in capture_moves
+        else:
+            quiet_moves = board.generate_quiet_moves()
+            is_legal = hash_move in quiet_moves
+        if is_legal:
+            yield hash_move
+        else:
+            hash_move = None
+
+    if capture_moves is None:
+        capture_moves = board.generate_capture_moves()
+    winning_captures = []
+    losing_captures = []
+    for move in capture_moves:
+        if move == hash_move:
+            continue
+        victim = board.piece_type_at(move.to_square) or chess.PAWN
+        attacker = board.piece_type_at(move.from_square)
+        # Taking a piece at least as valuable as the capturer never loses material, no need for the exchange
+        if piece_raw_values_typed[victim] >= piece_raw_values_typed[attacker]:
+            winning_captures.append(move)
+        else:
+            exchange_score = see(board, move)
+            if exchange_score >= 0:
+                winning_captures.append(move)
+            else:
+                losing_captures.append((exchange_score, move))
+
+    winning_captures.sort(key=lambda move: mvv_lva(move, board), reverse=True)
+    for move in winning_captures:
+        yield move
+
+    if quiet_moves is None:
+        quiet_moves = board.generate_quiet_moves()
+    played_killers = []
+    for killer in killers:
+        if killer is not None and killer != hash_move and killer in quiet_moves:
+            played_killers.append(killer)
+            yield killer
+
+    quiet_moves = [move for move in quiet_moves if move != hash_move and move not in played_killers]
+    # No attackers scan per quiet move: it costs more than the ordering it brings. History first, the static
+    # priority only breaks ties (moves that never produced a cutoff)
+    if heuristics is not None:
+        quiet_moves.sort(key=lambda move: (heuristics.history_score(move), quiet_move_priority(move)), reverse=True)
+    else:
+        quiet_moves.sort(key=quiet_move_priority, reverse=True)
+    for move in quiet_moves:
+        yield move
+
+    losing_captures.sort(key=lambda scored_move: scored_move[0], reverse=True)
+    for _, move in losing_captures:
+        yield move
@@ -0,0 +1,655 @@
+"""
+Negamax version of the search: a single code path for both sides, scores are relative to the side to move.
+Moves after the first one are searched with a null window first (principal variation search), and only searched
+again with the full window when they turn out to beat alpha.
+With a process pool, the same scheme is applied at the root with the null window searches running in parallel.
+"""
+import itertools
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import chess
+from beartype.typing import Optional, Tuple
+from chess import Move
+from maxoul_chess.abstract_board import AbstractBoard
+from maxoul_chess.evaluation import evaluate, evaluate_static, evaluation_cache, MATE_SCORE
+from maxoul_chess.piece_position_values import piece_raw_values_typed
+from maxoul_chess.legal_moves_generation import pick_moves, get_quiescence_moves, MoveOrderingHeuristics, see
+from maxoul_chess.transposition_table import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from maxoul_chess.search_stats import SearchStats
+from maxoul_chess.stop_token import StopToken
+
+# Default table, used by both the search cache and the pv cache when the caller does not provide its own
+transposition_table = TranspositionTable(size_mb=64)
+
+# Width of the null window, scores are in centipawns
+NULL_WINDOW = 1
+
+# Safety margin of delta pruning: positional gains a capture can bring on top of the captured material
+DELTA_MARGIN = 200
+
+# Null-move pruning: depth reduction of the search after the null move, and minimal depth to try it
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 3
+
+# Late move reductions: moves searched at full depth first, and minimal depth to reduce the next ones
+LMR_FULL_DEPTH_MOVES = 3
+LMR_MIN_DEPTH = 3
+
+# Scores beyond this are checkmates, MATE_SCORE minus the distance to the mate in plies
+MATE_THRESHOLD = MATE_SCORE - 1000
+
+# The clock is only read once every this many nodes (a power of two), not at each move
+TIME_CHECK_NODES = 256
+
+
+def mated_score(ply: int) -> float:
+    """Score of the side to move when it is checkmated ply plies from the root: later mates are better."""
+    return -MATE_SCORE + ply
+
+
+def score_to_tt(score: float, ply: int) -> float:
+    """
+    Mate scores are stored in the table relative to the position (distance from it to the mate) rather than to the
+    root, the same position being reached at different plies.
+    """
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+
+def score_from_tt(score: float, ply: int) -> float:
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+def plies_to_mate(score: float) -> Optional[int]:
+    """Number of plies to the checkmate a score announces, None if it is not a mate score."""
+    if abs(score) < MATE_THRESHOLD:
+        return None
+    return int(MATE_SCORE - abs(score))
+
+
+def has_non_pawn_material(board: AbstractBoard, color: bool) -> bool:
+    """
+    Whether color has a piece besides its king and pawns. Without one, zugzwang is common (pawn endgames) and
+    passing is not a safe lower bound of the position.
+    """
+    return bool(board.pieces_mask(chess.KNIGHT, color) | board.pieces_mask(chess.BISHOP, color) |
+                board.pieces_mask(chess.ROOK, color) | board.pieces_mask(chess.QUEEN, color))
+
+
+def late_move_reduction(depth: int, move_index: int) -> int:
+    """Depth reduction of the move_index-th move (from 1) searched at a node, 0 for the first moves."""
+    if depth < LMR_MIN_DEPTH or move_index <= LMR_FULL_DEPTH_MOVES:
+        return 0
+    return 2 if move_index > 2 * LMR_FULL_DEPTH_MOVES and depth > LMR_MIN_DEPTH else 1
+
+
+def check_extension(board: AbstractBoard, move: Move) -> int:
+    """
+    Called right after move is played: 1 when it gives check without losing material (static exchange evaluation),
+    the depth is then extended by one ply.
+    """
+    if not board.is_check():
+        return 0
+    board.pop()
+    safe_check = see(board, move) >= 0
+    board.push(move)
+    return 1 if safe_check else 0
+
+
+def bound_type(score: float, alpha: float, beta: float) -> int:
+    """
+    What a score returned by a search called with the (alpha, beta) window tells about the true score.
+    """
+    if score <= alpha:
+        return UPPER_BOUND
+    if score >= beta:
+        return LOWER_BOUND
+    return EXACT
+
+
+def quiescence(board: AbstractBoard,
+               depth: int,
+               alpha: float,
+               beta: float,
+               color: int,
+               z_hash: int = None,
+               use_eval_cache: bool = False,
+               stats: SearchStats = None,
+               ply: int = 0) -> float:
+    """
+    Quiescence search, the score is from the point of view of the side to move (color is 1 for white, -1 for black).
+    z_hash: key of the position if the caller already has it, read from the board otherwise.
+    ply: distance to the root of the search, for the mate scores.
+    stats: counters of the search, a throwaway one when None.
+    """
+    if stats is None:
+        stats = SearchStats()
+    stats.q_nodes += 1
+
+    if use_eval_cache and z_hash is None:
+        z_hash = board.hash()
+
+    in_check = board.is_check()
+    if in_check:
+        stand_pat = color * evaluate(board, z_hash=z_hash, use_cache=use_eval_cache)
+        if stand_pat <= -MATE_SCORE:
+            return mated_score(ply)
+    else:
+        # Fast path: no checkmate without a check, and stalemates are left to the main search. Repetitions and the
+        # fifty-move rule are cheap to look for, insufficient material is looked for by negamax
+        if ply > 0 and (board.is_repetition(2) or board.is_fifty_moves()):
+            return 0
+        stand_pat = color * evaluate_static(board, z_hash=z_hash, use_cache=use_eval_cache)
+
+    if depth == 0 or stand_pat >= beta:
+        return stand_pat
+
+    moves = get_quiescence_moves(board)
+    if len(moves) == 0:
+        return stand_pat
+
+    alpha = max(alpha, stand_pat)
+
+    # Out of check, the side to move can keep the stand pat score instead of capturing
+    best_score = -float('inf') if in_check else stand_pat
+    for move in moves:
+        # Delta pruning: even winning the captured piece for free would not bring the score up to alpha
+        if not in_check:
+            victim = board.piece_type_at(move.to_square) or chess.PAWN  # en passant
+            gain = piece_raw_values_typed[victim] if board.is_capture(move) else 0
+            if move.promotion is not None:
+                gain += piece_raw_values_typed[move.promotion] - piece_raw_values_typed[chess.PAWN]
+            optimistic_score = stand_pat + gain + DELTA_MARGIN
+            if optimistic_score <= alpha:
+                # The move is not searched, its score is only known to be below optimistic_score
+                best_score = max(best_score, optimistic_score)
+                continue
+
+        board.push(move)
+        score = -quiescence(board, depth - 1, -beta, -alpha, -color, use_eval_cache=use_eval_cache, stats=stats,
+                            ply=ply + 1)
+        board.pop()
+        best_score = max(best_score, score)
+        if best_score >= beta:
+            return best_score
+        alpha = max(alpha, best_score)
+    return best_score
+
+
+def negamax(board: AbstractBoard,
+            depth: int,
+            alpha: float,
+            beta: float,
+            color: int,
+            capture_max_depth: int = 4,
+            pruning: bool = True,
+            candidate_best_move: Move = None,
+            max_end_time: float = None,
+            use_search_cache: bool = False,
+            use_eval_cache: bool = False,
+            use_pv_cache: bool = False,
+            tt: TranspositionTable = None,
+            heuristics: MoveOrderingHeuristics = None,
+            ply: int = 0,
+            stop_token: StopToken = None,
+            stats: SearchStats = None,
+            null_move: bool = False,
+            late_move_reductions: bool = False,
+            extensions: int = 0) -> Tuple[float, Optional[Move], bool]:
+    """
+    heuristics: killer and history tables, updated on beta cutoffs and used to order quiet moves.
+    ply: distance to the root of the search.
+    null_move: when passing would already fail high, the node is cut without searching its moves (null-move pruning).
+    Never tried in check, without pieces besides pawns, at the root or right after another null move.
+    late_move_reductions: quiet moves late in the move ordering are searched with a reduced depth first, and again
+    at full depth when they beat alpha.
+    extensions: plies added by check extensions on the way from the root, at most half of the root depth.
+    max_end_time: the clock is checked every TIME_CHECK_NODES nodes, and stop_token set once it is past.
+    stop_token: checked at every node, possibly set by another thread or process. Once set, every node returns at
+    once with the cancelled flag: the moves not fully searched are left out of the result, and out of the table.
+    stats: counters of the search, a throwaway one when None.
+    :return: score from the point of view of the side to move, best move and whether the search was cancelled.
+    """
+    if stats is None:
+        stats = SearchStats()
+    stats.nodes += 1
+    if stop_token is None and max_end_time is not None:
+        stop_token = StopToken()
+    if stop_token is not None:
+        if max_end_time is not None and not stats.nodes & (TIME_CHECK_NODES - 1) and time.time() > max_end_time:
+            stop_token.set()
+        if stop_token.is_set():
+            stats.cancelled = True
+            return alpha, None, True
+
+    # Draws by rule, before the table probe: a score stored for the same position reached by another path would hide
+    # the draw. A position repeated once in the game or in the search is scored as a draw, the side to move can
+    # repeat it again.
+    if ply > 0 and (board.is_repetition(2) or board.is_fifty_moves() or board.is_insufficient_material()):
+        return 0, None, False
+
+    # Mate distance pruning: neither side can do better than mating right now
+    if ply > 0 and pruning:
+        alpha = max(alpha, mated_score(ply))
+        beta = min(beta, -mated_score(ply + 1))
+        if alpha >= beta:
+            return alpha, None, False
+
+    z_hash = None
+    if use_search_cache or use_eval_cache or use_pv_cache:
+        z_hash = board.hash()
+
+    if tt is None:
+        tt = transposition_table
+
+    tt_entry = None
+    if use_search_cache or use_pv_cache:
+        tt_entry = tt.probe(z_hash)
+        stats.tt_probes += 1
+        if tt_entry is not None:
+            stats.tt_hits += 1
+
+    # The window the search is called with: needed to know whether the result is exact or only a bound
+    original_alpha, original_beta = alpha, beta
+
+    # Not at the root: the search must return a move, and the entry may have none (null-move cutoff, no move kept)
+    if use_search_cache and ply > 0 and tt_entry is not None and tt_entry[0] >= depth:
+        tt_depth, tt_score, tt_bound, tt_move = tt_entry
+        tt_score = score_from_tt(tt_score, ply)
+        if tt_bound == EXACT:
+            stats.tt_cutoffs += 1
+            return tt_score, tt_move, False
+        elif tt_bound == LOWER_BOUND:
+            alpha = max(alpha, tt_score)
+        else:
+            beta = min(beta, tt_score)
+        if alpha >= beta:
+            stats.tt_cutoffs += 1
+            return tt_score, tt_move, False
+
+    if use_pv_cache and candidate_best_move is None and tt_entry is not None:
+        candidate_best_move = tt_entry[3]
+
+    if depth == 0:
+        score = quiescence(board, capture_max_depth, alpha, beta, color,
+                           z_hash=z_hash, use_eval_cache=use_eval_cache, stats=stats, ply=ply)
+        if use_search_cache:
+            tt.store(z_hash, depth, score_to_tt(score, ply), bound_type(score, original_alpha, original_beta), None)
+        return score, None, False
+
+    in_check = (null_move or late_move_reductions) and board.is_check()
+
+    # Null-move pruning: give the opponent a free move, if a reduced search still fails high the node would too
+    if null_move and pruning and depth >= NULL_MOVE_MIN_DEPTH and ply > 0 and beta < MATE_THRESHOLD \
+            and not in_check and board.peek() and has_non_pawn_material(board, board.turn) \
+            and color * evaluate_static(board, z_hash=z_hash, use_cache=use_eval_cache) >= beta:
+        board.push_null()
+        null_score, _, null_cancelled = negamax(board, max(depth - 1 - NULL_MOVE_REDUCTION, 0), -beta,
+                                                -beta + NULL_WINDOW, -color,
+                                                capture_max_depth=capture_max_depth,
+                                                pruning=pruning,
+                                                max_end_time=max_end_time,
+                                                use_search_cache=use_search_cache,
+                                                use_eval_cache=use_eval_cache,
+                                                use_pv_cache=use_pv_cache,
+                                                tt=tt,
+                                                heuristics=heuristics,
+                                                ply=ply + 1,
+                                                stop_token=stop_token,
+                                                stats=stats,
+                                                null_move=null_move,
+                                                late_move_reductions=late_move_reductions)
+        board.pop_null()
+        if null_cancelled:
+            return alpha, None, True
+        null_score = -null_score
+        if null_score >= beta:
+            stats.null_move_cutoffs += 1
+            score = min(null_score, MATE_THRESHOLD - 1)
+            if use_search_cache:
+                tt.store(z_hash, depth, score_to_tt(score, ply), LOWER_BOUND, None)
+            return score, None, False
+
+    # Lazy: moves are only generated (and sorted) when the previous ones did not produce a cutoff
+    if heuristics is not None:
+        ordered_moves = pick_moves(board, hash_move=candidate_best_move,
+                                   killers=heuristics.get_killers(ply), heuristics=heuristics)
+    else:
+        ordered_moves = pick_moves(board, hash_move=candidate_best_move)
+
+    best_score = -float('inf')
+    best_move = None
+    search_cancelled = False
+
+    def search_child(child_alpha, child_beta, reduction=0, extension=0):
+        """:return: score of the child from our point of view, and whether its search was cancelled."""
+        child_score, _, child_cancelled = negamax(board, depth - 1 - reduction + extension, -child_beta, -child_alpha,
+                                                  -color,
+                                                  capture_max_depth=capture_max_depth,
+                                                  pruning=pruning,
+                                                  max_end_time=max_end_time,
+                                                  use_search_cache=use_search_cache,
+                                                  use_eval_cache=use_eval_cache,
+                                                  use_pv_cache=use_pv_cache,
+                                                  tt=tt,
+                                                  heuristics=heuristics,
+                                                  ply=ply + 1,
+                                                  stop_token=stop_token,
+                                                  stats=stats,
+                                                  null_move=null_move,
+                                                  late_move_reductions=late_move_reductions,
+                                                  extensions=extensions + extension)
+        return -child_score, child_cancelled
+
+    # Check extension: moves giving check are searched one ply deeper, as long as the extensions of the branch stay
+    # within half of the root depth
+    can_extend = 2 * extensions < ply + depth - extensions
+    killers = heuristics.get_killers(ply) if heuristics is not None else ()
+    # In pawn endgames, a quiet pawn move is rarely harmless: no reductions
+    reduce_late_moves = late_move_reductions and pruning and not in_check and has_non_pawn_material(board, board.turn)
+
+    n_searched_moves = 0
+    for move in ordered_moves:
+        n_searched_moves += 1
+
+        reduction = 0
+        if reduce_late_moves and move.promotion is None and move not in killers:
+            reduction = late_move_reduction(depth, n_searched_moves)
+            if reduction and board.is_capture(move):
+                reduction = 0
+
+        if ply == 0:
+            move_nodes = stats.nodes + stats.q_nodes
+        board.push(move)
+        gives_check = board.is_check()
+        extension = check_extension(board, move) if gives_check and can_extend else 0
+        if best_move is None or not pruning:
+            score, search_cancelled = search_child(alpha, beta, extension=extension)
+        else:
+            score = None
+            # Late move reduction, except for checks: a reduced null window search first, that the move most likely
+            # fails low
+            if reduction and not gives_check:
+                stats.reduced_moves += 1
+                score, search_cancelled = search_child(alpha, alpha + NULL_WINDOW, reduction)
+            if not search_cancelled and (score is None or score > alpha):
+                # Principal variation search: we only check that the move is not better than our best one so far
+                score, search_cancelled = search_child(alpha, alpha + NULL_WINDOW, extension=extension)
+                if not search_cancelled and alpha < score < beta:
+                    score, search_cancelled = search_child(alpha, beta, extension=extension)
+        board.pop()
+        if ply == 0:
+            stats.root_move_nodes[move] = stats.root_move_nodes.get(move, 0) + stats.nodes + stats.q_nodes - move_nodes
+        # Cancelled below: the score of the move is not a real one
+        if search_cancelled:
+            break
+
+        if score > best_score:
+            best_score = score
+            best_move = move
+        alpha = max(alpha, best_score)
+        if pruning and alpha >= beta:
+            stats.beta_cutoffs += 1
+            if n_searched_moves == 1:
+                stats.first_move_cutoffs += 1
+            if heuristics is not None and move.promotion is None and not board.is_capture(move):
+                heuristics.update(move, ply, depth)
+            break
+
+    if search_cancelled:
+        return best_score, best_move, True
+
+    # If there were no legal moves, checkmate or stalemate
+    if best_move is None:
+        best_score = mated_score(ply) if board.is_check() else 0
+
+    if use_search_cache or use_pv_cache:
+        tt.store(z_hash, depth, score_to_tt(best_score, ply), bound_type(best_score, original_alpha, original_beta),
+                 best_move)
+
+    return best_score, best_move, False
+
+
+def search_root_move(board: AbstractBoard,
+                     move: Move,
+                     depth: int,
+                     alpha: float,
+                     beta: float,
+                     color: int,
+                     max_end_time: float,
+                     search_options: dict,
+                     stop_token: StopToken = None,
+                     search_id: Tuple[int, int] = None) -> Tuple[float, bool, SearchStats]:
+    """
+    Task of the root split workers: search of one root move, with the table and move ordering heuristics the worker
+    process keeps from one task to the next.
+    stop_token: a shared one, to stop all the workers at once.
+    search_id: (key of the root position, number of the root search). The heuristics of the worker are aged on the
+    first task of each root search, and cleared when the root position changes.
+    :return: score from the point of view of color, whether the search was cancelled and the stats of the search.
+    """
+    global worker_search_id
+    if search_id is not None and search_id != worker_search_id:
+        if worker_search_id is None or search_id[0] != worker_search_id[0]:
+            worker_heuristics.clear()
+        else:
+            worker_heuristics.age()
+        worker_search_id = search_id
+    stats = SearchStats()
+    board.push(move)
+    extension = check_extension(board, move)
+    score, _, search_cancelled = negamax(board, depth - 1 + extension, -beta, -alpha, -color,
+                                         max_end_time=max_end_time,
+                                         heuristics=worker_heuristics,
+                                         ply=1,
+                                         stop_token=stop_token,
+                                         stats=stats,
+                                         extensions=extension,
+                                         **search_options)
+    board.pop()
+    return -score, search_cancelled, stats
+
+
+worker_heuristics = MoveOrderingHeuristics()
+worker_search_id: Optional[Tuple[int, int]] = None
+
+# Numbers the root split searches of this process, to tell the workers when a new one starts
+root_split_searches = itertools.count()
+
+
+def init_root_split_worker(tt_mb: float) -> None:
+    global transposition_table
+    transposition_table = TranspositionTable(size_mb=tt_mb)
+
+
+def create_root_split_pool(n_workers: int, tt_mb: float = 16) -> ProcessPoolExecutor:
+    """
+    Pool for the root split search, meant to be kept alive across moves: the processes are only started once, and
+    keep their transposition table from one search to the next.
+    """
+    return ProcessPoolExecutor(max_workers=n_workers, initializer=init_root_split_worker, initargs=(tt_mb,))
+
+
+def root_split_negamax(board: AbstractBoard,
+                       depth: int,
+                       alpha: float,
+                       beta: float,
+                       color: int,
+                       executor: ProcessPoolExecutor,
+                       candidate_best_move: Move = None,
+                       max_end_time: float = None,
+                       tt: TranspositionTable = None,
+                       heuristics: MoveOrderingHeuristics = None,
+                       stats: SearchStats = None,
+                       stop_token: StopToken = None,
+                       **search_options) -> Tuple[float, Optional[Move], bool]:
+    """
+    Root of the search split over the processes of executor. The first move is searched here with the full window,
+    the other ones are sent to the pool with a null window on the resulting alpha, and searched again with the full
+    window when they fail high.
+    stop_token: when shared, the workers check it too, otherwise they only stop at max_end_time.
+    search_options: capture_max_depth, pruning and cache flags, as for negamax.
+    """
+    if stats is None:
+        stats = SearchStats()
+    if tt is None:
+        tt = transposition_table
+    use_table = search_options.get('use_search_cache') or search_options.get('use_pv_cache')
+    z_hash = board.hash() if use_table else None
+    if candidate_best_move is None and search_options.get('use_pv_cache'):
+        candidate_best_move = tt.probe_move(z_hash)
+
+    moves = list(pick_moves(board, hash_move=candidate_best_move))
+    if depth <= 1 or len(moves) <= 1 or not search_options.get('pruning', True):
+        return negamax(board, depth, alpha, beta, color, candidate_best_move=candidate_best_move,
+                       max_end_time=max_end_time, tt=tt, heuristics=heuristics, stats=stats, stop_token=stop_token,
+                       **search_options)
+
+    original_alpha = alpha
+    stats.nodes += 1
+    move_nodes = stats.nodes + stats.q_nodes
+    board.push(moves[0])
+    extension = check_extension(board, moves[0])
+    score, _, search_cancelled = negamax(board, depth - 1 + extension, -beta, -alpha, -color,
+                                         max_end_time=max_end_time, tt=tt, heuristics=heuristics, ply=1, stats=stats,
+                                         stop_token=stop_token, extensions=extension, **search_options)
+    board.pop()
+    stats.root_move_nodes[moves[0]] = stats.nodes + stats.q_nodes - move_nodes
+    if search_cancelled:
+        return -float('inf'), None, True
+    best_score = -score
+    best_move = moves[0]
+    alpha = max(alpha, best_score)
+    if alpha >= beta:
+        return best_score, best_move, search_cancelled
+
+    worker_stop_token = stop_token if stop_token is not None and stop_token.shared else None
+    search_id = (board.hash(), next(root_split_searches))
+
+    def submit(move, window_alpha, window_beta):
+        return executor.submit(search_root_move, board, move, depth, window_alpha, window_beta, color, max_end_time,
+                               search_options, worker_stop_token, search_id)
+
+    # future -> (move, alpha of the window, whether it is the full window search)
+    tasks = {}
+    for move in moves[1:]:
+        tasks[submit(move, alpha, alpha + NULL_WINDOW)] = (move, alpha, False)
+
+    pending = set(tasks)
+    while pending:
+        timeout = None if max_end_time is None else max(max_end_time - time.time(), 0)
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            stats.cancelled = True
+            search_cancelled = True
+            if stop_token is not None:
+                stop_token.set()
+            break
+        for future in done:
+            move, window_alpha, full_window = tasks.pop(future)
+            score, move_cancelled, move_stats = future.result()
+            stats.add(move_stats)
+            stats.root_move_nodes[move] = stats.root_move_nodes.get(move, 0) + move_stats.nodes + move_stats.q_nodes
+            if move_cancelled:
+                search_cancelled = True
+                continue
+            if score <= window_alpha:
+                continue  # Fail low: not better than the best move when it was sent
+            if score <= alpha:
+                if not full_window:
+                    # Fail high on an older null window: only a lower bound, and alpha rose since. The move may still
+                    # beat the current alpha, it is tried again with a null window on it
+                    research = submit(move, alpha, alpha + NULL_WINDOW)
+                    tasks[research] = (move, alpha, False)
+                    pending.add(research)
+                continue
+            if not full_window and score < beta:
+                # Fail high on the null window: the real score is needed
+                research = submit(move, alpha, beta)
+                tasks[research] = (move, alpha, True)
+                pending.add(research)
+                continue
+            best_score = score
+            best_move = move
+            alpha = max(alpha, best_score)
+        if search_cancelled or alpha >= beta:
+            break
+
+    # Searches which did not start yet are dropped, the running ones stop by themselves at max_end_time, or as soon as
+    # a shared stop token is set
+    for future in pending:
+        future.cancel()
+
+    if not search_cancelled and use_table:
+        tt.store(z_hash, depth, best_score, bound_type(best_score, original_alpha, beta), best_move)
+
+    return best_score, best_move, search_cancelled
+
+
+def negamax_search(board: AbstractBoard,
+                   depth: int = 2,
+                   maximizing_player: bool = True,
+                   alpha: float = -float('inf'),
+                   beta: float = float('inf'),
+                   capture_max_depth: int = 4,
+                   pruning: bool = True,
+                   candidate_best_move: Move = None,
+                   max_end_time: float = None,
+                   use_search_cache: bool = False,
+                   use_eval_cache: bool = False,
+                   use_pv_cache: bool = False,
+                   tt: TranspositionTable = None,
+                   heuristics: MoveOrderingHeuristics = None,
+                   executor: ProcessPoolExecutor = None,
+                   stats: SearchStats = None,
+                   null_move: bool = False,
+                   late_move_reductions: bool = False,
+                   stop_token: StopToken = None):
+    """
+    Same entry point as the original min max search: alpha, beta and the returned score are from white's point of
+    view, maximizing_player tells whether white is to move.
+    executor: pool created by create_root_split_pool, to split the root moves over several processes.
+    stop_token: set by the search at max_end_time, or by the caller to stop it from another thread or process.
+    stats: filled with the counters of the search, which add up to the ones already there.
+    """
+    if stats is None:
+        stats = SearchStats()
+    eval_cache_probes, eval_cache_hits = evaluation_cache.n_probes, evaluation_cache.n_gets
+    color = 1 if maximizing_player else -1
+    if color == -1:
+        alpha, beta = -beta, -alpha
+    search_options = dict(capture_max_depth=capture_max_depth,
+                          pruning=pruning,
+                          use_search_cache=use_search_cache,
+                          use_eval_cache=use_eval_cache,
+                          use_pv_cache=use_pv_cache,
+                          null_move=null_move,
+                          late_move_reductions=late_move_reductions)
+    if executor is not None:
+        score, best_move, search_cancelled = root_split_negamax(board, depth, alpha, beta, color, executor,
+                                                                candidate_best_move=candidate_best_move,
+                                                                max_end_time=max_end_time,
+                                                                tt=tt,
+                                                                heuristics=heuristics,
+                                                                stats=stats,
+                                                                stop_token=stop_token,
+                                                                **search_options)
+    else:
+        score, best_move, search_cancelled = negamax(board, depth, alpha, beta, color,
+                                                     candidate_best_move=candidate_best_move,
+                                                     max_end_time=max_end_time,
+                                                     tt=tt,
+                                                     heuristics=heuristics,
+                                                     stats=stats,
+                                                     stop_token=stop_token,
+                                                     **search_options)
+    stats.eval_cache_probes += evaluation_cache.n_probes - eval_cache_probes
+    stats.eval_cache_hits += evaluation_cache.n_gets - eval_cache_hits
+    return color * score, best_move, search_cancelled
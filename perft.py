@@ -0,0 +1,150 @@
+"""
+Perft: number of leaves of the legal move tree, to validate a board backend against known counts.
+
+The leaves are counted in bulk at depth 1 (the length of the legal move list, no push/pop), subtrees already counted
+are found again in a hash table keyed by the zobrist hash and the depth, and the root moves can be shared out over
+processes. Works with any AbstractBoard.
+
+    python -m maxoul_chess.perft 6
+    python -m maxoul_chess.perft 5 --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1" --divide
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import chess
+from beartype.typing import Dict, Optional, Type
+from maxoul_chess.abstract_board import AbstractBoard
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+
+# Mixes the depth into the table index, so that one position at several depths does not always collide
+DEPTH_MIX = 0x9E3779B97F4A7C15
+MASK_64 = (1 << 64) - 1
+
+
+class PerftTable:
+    """
+    Leaf counts by (zobrist hash, depth), always replacing, same layout as the evaluation cache.
+    """
+    def __init__(self, size_mb: float = 16):
+        n_entries = 1
+        while 2 * n_entries * 17 <= size_mb * 1024 * 1024:
+            n_entries *= 2
+        self.size_mb = size_mb
+        self.n_entries = n_entries
+        self.mask = n_entries - 1
+        self.buffer = bytearray(17 * n_entries)
+        view = memoryview(self.buffer)
+        self.keys = view[0: 8 * n_entries].cast('Q')
+        self.counts = view[8 * n_entries: 16 * n_entries].cast('Q')
+        self.depths = view[16 * n_entries:].cast('B')
+        self.n_gets = 0
+
+    def get(self, key: int, depth: int) -> Optional[int]:
+        index = ((key ^ depth * DEPTH_MIX) & MASK_64) & self.mask
+        if self.keys[index] == key and self.depths[index] == depth:
+            self.n_gets += 1
+            return self.counts[index]
+        return None
+
+    def insert(self, key: int, depth: int, count: int) -> None:
+        index = ((key ^ depth * DEPTH_MIX) & MASK_64) & self.mask
+        self.keys[index] = key
+        self.depths[index] = depth
+        self.counts[index] = count
+
+
+def perft(board: AbstractBoard, depth: int, table: PerftTable = None) -> int:
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return len(board.generate_legal_moves())
+
+    if table is not None:
+        key = board.hash()
+        count = table.get(key, depth)
+        if count is not None:
+            return count
+
+    count = 0
+    for move in board.generate_legal_moves():
+        board.push(move)
+        count += perft(board, depth - 1, table)
+        board.pop()
+
+    if table is not None:
+        table.insert(key, depth, count)
+    return count
+
+
+def divide(board: AbstractBoard, depth: int, table: PerftTable = None) -> Dict[str, int]:
+    """Leaf count below each root move, by uci, to find which move a backend gets wrong."""
+    out = {}
+    for move in board.generate_legal_moves():
+        board.push(move)
+        out[move.uci()] = perft(board, depth - 1, table)
+        board.pop()
+    return out
+
+
+# Hash table of the worker process, kept between the root moves it is given
+worker_table: Optional[PerftTable] = None
+
+
+def init_perft_worker(table_mb: float) -> None:
+    global worker_table
+    worker_table = PerftTable(table_mb) if table_mb else None
+
+
+def perft_root_move(board_class: Type[AbstractBoard], fen: str, uci: str, depth: int) -> int:
+    board = board_class(fen=fen)
+    board.push(chess.Move.from_uci(uci))
+    return perft(board, depth - 1, worker_table)
+
+
+def parallel_divide(fen: str, depth: int, n_workers: int, board_class: Type[AbstractBoard] = BitboardChessBoard,
+                    table_mb: float = 16) -> Dict[str, int]:
+    """divide with the root moves shared out over n_workers processes, each with its own hash table."""
+    board = board_class(fen=fen)
+    ucis = [move.uci() for move in board.generate_legal_moves()]
+    if depth <= 1:
+        return {uci: 1 for uci in ucis}
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=init_perft_worker, initargs=(table_mb,)) as executor:
+        counts = executor.map(perft_root_move, [board_class] * len(ucis), [fen] * len(ucis), ucis,
+                              [depth] * len(ucis))
+        return dict(zip(ucis, counts))
+
+
+def board_classes() -> Dict[str, Type[AbstractBoard]]:
+    out = {'bitboard': BitboardChessBoard}
+    try:
+        from maxoul_chess.python_chess_board import PythonChessBoard
+        out['python'] = PythonChessBoard
+    except ImportError:
+        pass
+    return out
+
+
+if __name__ == '__main__':
+    classes = board_classes()
+    parser = argparse.ArgumentParser(description='Leaf count of the legal move tree')
+    parser.add_argument('depth', type=int)
+    parser.add_argument('--fen', default=chess.STARTING_FEN)
+    parser.add_argument('--board', default='bitboard', choices=sorted(classes))
+    parser.add_argument('--workers', type=int, default=1, help='processes sharing out the root moves')
+    parser.add_argument('--table-mb', type=float, default=16, help='hash table size per process, 0 to disable')
+    parser.add_argument('--divide', action='store_true', help='print the count below each root move')
+    args = parser.parse_args()
+
+    t0 = time.time()
+    if args.workers > 1:
+        counts = parallel_divide(args.fen, args.depth, args.workers, classes[args.board], args.table_mb)
+    else:
+        table = PerftTable(args.table_mb) if args.table_mb else None
+        counts = divide(classes[args.board](fen=args.fen), args.depth, table)
+    duration = time.time() - t0
+
+    if args.divide:
+        for uci, count in sorted(counts.items()):
+            print(f'{uci}: {count}')
+    total = sum(counts.values())
+    print(f'perft({args.depth}) = {total} in {duration:.2f}s ({total / max(duration, 1e-9):.0f} leaves/s)')
@@ -170,22 +170,49 @@ beginning_square_sets_white = {key: val.flatten() for key, val in beginning_squa
 endgame_square_sets_black = {key: val[::-1].flatten() for key, val in endgame_square_sets_white.items()}
 endgame_square_sets_white = {key: val.flatten() for key, val in endgame_square_sets_white.items()}
 
+# Same tables stacked for the batch evaluation, one row per (color, piece type) at index 6 * color + piece_type - 1,
+# with the sign of the color and the raw value of the piece folded in
+batch_piece_indices = [(color, piece_type) for color in (chess.BLACK, chess.WHITE) for piece_type in range(1, 7)]
+batch_signs = np.array([1 if color == chess.WHITE else -1 for color, _ in batch_piece_indices], dtype=np.float64)
+batch_raw_values = np.array([piece_raw_values_typed[piece_type] for _, piece_type in batch_piece_indices],
+                            dtype=np.float64)
+batch_non_pawn_values = np.where([piece_type != chess.PAWN for _, piece_type in batch_piece_indices],
+                                 batch_raw_values, 0.)
+batch_beginning_tables = np.stack([
+    (beginning_square_sets_white if color == chess.WHITE else beginning_square_sets_black)[piece_type]
+    for color, piece_type in batch_piece_indices]).astype(np.float64)
+batch_endgame_tables = np.stack([
+    (endgame_square_sets_white if color == chess.WHITE else endgame_square_sets_black)[piece_type]
+    for color, piece_type in batch_piece_indices]).astype(np.float64)
+batch_beginning_tables = batch_signs[:, None] * (batch_raw_values[:, None] + batch_beginning_tables)
+batch_endgame_tables = batch_signs[:, None] * (batch_raw_values[:, None] + batch_endgame_tables)
+
+
+def pst_index(piece_type: int, color: bool) -> int:
+    """Offset of the 64 squares of (piece_type, color) in the flat tables."""
+    return piece_type * 128 + color * 64
+
+
+# Flat tables of plain Python ints, indexed by piece_type * 128 + color * 64 + square
+pst_beginning = [0] * (7 * 128)
+pst_endgame = [0] * (7 * 128)
+for _piece_type in range(1, 7):
+    for _color, _beginning, _endgame in ((chess.WHITE, beginning_square_sets_white, endgame_square_sets_white),
+                                         (chess.BLACK, beginning_square_sets_black, endgame_square_sets_black)):
+        _offset = pst_index(_piece_type, _color)
+        pst_beginning[_offset: _offset + 64] = [int(value) for value in _beginning[_piece_type]]
+        pst_endgame[_offset: _offset + 64] = [int(value) for value in _endgame[_piece_type]]
+
 
 def square_set_to_value(sq_set, game_phase: str, piece: chess.Piece, color):
     if game_phase == 'beginning':
-        if color == chess.WHITE:
-            pst = beginning_square_sets_white[piece]
-        else:
-            pst = beginning_square_sets_black[piece]
+        pst = pst_beginning
     elif game_phase == 'endgame':
-        if color == chess.WHITE:
-            pst = endgame_square_sets_white[piece]
-        else:
-            pst = endgame_square_sets_black[piece]
+        pst = pst_endgame
     else:
         raise ValueError(game_phase)
-
-    return sum([pst[i] for i in sq_set])
+    offset = pst_index(piece, color)
+    return sum([pst[offset + i] for i in sq_set])
 
 
 if __name__ == '__main__':
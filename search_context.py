@@ -0,0 +1,78 @@
+"""
+Search state of one game, kept from one move to the next.
+"""
+import chess
+from beartype.typing import List, Optional, Tuple
+from chess import Move
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.legal_moves_generation import MoveOrderingHeuristics
+from maxoul_chess.transposition_table import TranspositionTable, EXACT
+
+
+class SearchContext:
+    """
+    Transposition table, move ordering heuristics and principal variation expected after the last move of a game.
+    The table entries are aged by move number, the history scores are halved and the killers shifted by the number
+    of plies played since the previous search.
+    """
+    def __init__(self, transposition_table: TranspositionTable, move_ordering: MoveOrderingHeuristics = None):
+        self.transposition_table = transposition_table
+        self.move_ordering = MoveOrderingHeuristics() if move_ordering is None else move_ordering
+        self.root_fen = None
+        self.move_stack = []  # moves of the game, our last move included, when the last search ended
+        self.expected_pv = []  # expected continuation after our last move
+
+    def is_same_game(self, board: chess.Board) -> bool:
+        return self.root_fen == board.root().fen() and board.move_stack[:len(self.move_stack)] == self.move_stack
+
+    def new_game(self) -> None:
+        self.transposition_table.clear()
+        self.move_ordering.clear()
+        self.move_stack = []
+        self.expected_pv = []
+
+    def start_move(self, board: chess.Board) -> None:
+        if self.root_fen is None or not self.is_same_game(board):
+            self.new_game()
+            self.root_fen = board.root().fen()
+        else:
+            self.move_ordering.shift(len(board.move_stack) + 1 - len(self.move_stack))
+            self.move_ordering.age()
+        self.transposition_table.new_search(age=board.fullmove_number)
+
+    def end_move(self, board: chess.Board, maxoul_board: BitboardChessBoard, best_move: Move) -> None:
+        self.move_stack = board.move_stack + [best_move]
+        maxoul_board.push(best_move)
+        self.expected_pv = self.principal_variation(maxoul_board)
+        maxoul_board.pop()
+
+    def expected_reply(self) -> Optional[Move]:
+        return self.expected_pv[0] if self.expected_pv else None
+
+    def principal_variation(self, maxoul_board: BitboardChessBoard, max_length: int = 16) -> List[Move]:
+        """Best moves stored in the table, from the position of maxoul_board."""
+        pv = []
+        keys = set()
+        while len(pv) < max_length and maxoul_board.hash() not in keys:
+            keys.add(maxoul_board.hash())
+            move = self.transposition_table.probe_move(maxoul_board.hash())
+            if move is None or move not in maxoul_board.generate_legal_moves():
+                break
+            pv.append(move)
+            maxoul_board.push(move)
+        for _ in pv:
+            maxoul_board.pop()
+        return pv
+
+    def proven_result(self, maxoul_board: BitboardChessBoard) -> Optional[Tuple[int, float, Move]]:
+        """
+        Deepest exact result already in the table for the position, as (depth, evaluation from white's point of view,
+        best move), e.g. searched as part of the expected variation of the previous move.
+        """
+        entry = self.transposition_table.probe(maxoul_board.hash())
+        if entry is None:
+            return None
+        depth, score, bound, move = entry
+        if depth < 1 or bound != EXACT or move is None or move not in maxoul_board.generate_legal_moves():
+            return None
+        return depth, score if maxoul_board.turn == chess.WHITE else -score, move
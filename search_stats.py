@@ -0,0 +1,146 @@
+"""
+Statistics of a search, filled while searching and handed to a sink once the move is chosen.
+"""
+import json
+import sys
+import time
+from beartype.typing import Callable, List, Optional
+
+
+class SearchStats:
+    """
+    Counters of one search (one move of the bot, possibly several depths of iterative deepening).
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.q_nodes = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.tt_cutoffs = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0  # beta cutoffs produced by the first move searched
+        self.null_move_cutoffs = 0
+        self.reduced_moves = 0  # moves searched with a late move reduction first
+        self.aspiration_researches = 0  # searches again with a wider window after missing the aspiration window
+        self.fail_highs = 0  # aspiration misses above the window, from the point of view of the side to move
+        self.fail_lows = 0
+        self.eval_cache_probes = 0
+        self.eval_cache_hits = 0
+        self.cancelled = False
+        # Nodes searched below each root move, cleared by the caller at each iteration
+        self.root_move_nodes = {}
+        # (depth, seconds, nodes + q_nodes) of each iteration of the iterative deepening
+        self.depths = []
+        self.start_time = time.time()
+        self.end_time = None
+        self.info = {}  # free form fields added by the caller, e.g. the move played
+
+    def add(self, other: 'SearchStats') -> None:
+        """Adds the counters of other, e.g. the search of a root move by another process."""
+        for name in ('nodes', 'q_nodes', 'tt_probes', 'tt_hits', 'tt_cutoffs', 'beta_cutoffs', 'first_move_cutoffs',
+                     'null_move_cutoffs', 'reduced_moves', 'aspiration_researches', 'fail_highs',
+                     'fail_lows', 'eval_cache_probes', 'eval_cache_hits'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.cancelled = self.cancelled or other.cancelled
+
+    def record_depth(self, depth: int, duration: float, nodes: int) -> None:
+        self.depths.append((depth, duration, nodes))
+
+    def stop(self) -> None:
+        self.end_time = time.time()
+
+    @property
+    def duration(self) -> float:
+        end_time = time.time() if self.end_time is None else self.end_time
+        return end_time - self.start_time
+
+    @property
+    def nps(self) -> float:
+        """Nodes, quiescence ones included, per second."""
+        return (self.nodes + self.q_nodes) / max(self.duration, 1e-9)
+
+    def best_move_effort(self, move) -> float:
+        """Fraction of the nodes of the root moves spent on move, high when the other moves were refuted quickly."""
+        total = sum(self.root_move_nodes.values())
+        return self.root_move_nodes.get(move, 0) / total if total else 0.
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """How often the first move is the one producing the cutoff: a measure of the move ordering quality."""
+        return self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0.
+
+    @property
+    def eval_cache_hit_rate(self) -> float:
+        return self.eval_cache_hits / self.eval_cache_probes if self.eval_cache_probes else 0.
+
+    @property
+    def branching_factor(self) -> float:
+        """Effective branching factor: nodes of the last depth over nodes of the one before."""
+        if len(self.depths) < 2 or self.depths[-2][2] == 0:
+            return 0.
+        return self.depths[-1][2] / self.depths[-2][2]
+
+    def to_dict(self) -> dict:
+        return dict(self.info,
+                    nodes=self.nodes,
+                    q_nodes=self.q_nodes,
+                    duration=round(self.duration, 4),
+                    nps=round(self.nps),
+                    tt_probes=self.tt_probes,
+                    tt_hits=self.tt_hits,
+                    tt_hit_rate=round(self.tt_hit_rate, 4),
+                    tt_cutoffs=self.tt_cutoffs,
+                    beta_cutoffs=self.beta_cutoffs,
+                    first_move_cutoff_rate=round(self.first_move_cutoff_rate, 4),
+                    null_move_cutoffs=self.null_move_cutoffs,
+                    reduced_moves=self.reduced_moves,
+                    aspiration_researches=self.aspiration_researches,
+                    fail_highs=self.fail_highs,
+                    fail_lows=self.fail_lows,
+                    eval_cache_hit_rate=round(self.eval_cache_hit_rate, 4),
+                    branching_factor=round(self.branching_factor, 3),
+                    depths=[[depth, round(duration, 4), nodes] for depth, duration, nodes in self.depths],
+                    cancelled=self.cancelled)
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def __str__(self):
+        return (f'{self.nodes} nodes {self.q_nodes} q-nodes in {self.duration:.2f}s ({self.nps:.0f} nps), '
+                f'tt hits {self.tt_hit_rate:.1%} cutoffs {self.tt_cutoffs}, '
+                f'first move cutoffs {self.first_move_cutoff_rate:.1%}, '
+                f'eval cache hits {self.eval_cache_hit_rate:.1%}, branching factor {self.branching_factor:.2f}')
+
+
+# A sink is any callable taking the stats of a finished search
+StatsSink = Callable[[SearchStats], None]
+
+
+class JsonLinesSink:
+    """Writes the stats of each search as one JSON line, to a file path or an open text stream."""
+    def __init__(self, destination=None):
+        self.path = destination if isinstance(destination, str) else None
+        self.stream = sys.stdout if destination is None else destination
+
+    def __call__(self, stats: SearchStats) -> None:
+        if self.path is not None:
+            with open(self.path, 'a') as f:
+                f.write(stats.to_json() + '\n')
+        else:
+            self.stream.write(stats.to_json() + '\n')
+
+
+class ListSink:
+    """Keeps the stats in memory, e.g. for tests or to aggregate them later."""
+    def __init__(self, max_length: Optional[int] = None):
+        self.max_length = max_length
+        self.stats: List[SearchStats] = []
+
+    def __call__(self, stats: SearchStats) -> None:
+        self.stats.append(stats)
+        if self.max_length is not None and len(self.stats) > self.max_length:
+            self.stats.pop(0)
@@ -0,0 +1,59 @@
+"""
+Stop flag of a search, checked at every node: once set, the whole search tree unwinds.
+"""
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+
+
+class StopToken:
+    """
+    Set by the search itself at its deadline, or by any caller wanting the result now: a ponder miss, the end of a
+    game, a stop from a GUI thread. A shared token lives in one byte of shared memory: the processes of a search
+    (root split workers, lazy SMP helpers, game server workers) attach to it by name, and a stop set in any of them
+    is seen by all. The process creating it owns the block.
+    """
+    def __init__(self, shared: bool = False, name: str = None):
+        self.shared_memory = None
+        if shared or name is not None:
+            owner = name is None
+            self.shared_memory = SharedMemory(create=True, size=1) if owner else SharedMemory(name=name)
+            self.flag = self.shared_memory.buf
+            if owner:
+                self.flag[0] = 0
+            self._finalizer = weakref.finalize(self, release_stop_token, self.shared_memory, owner)
+        else:
+            self.flag = bytearray(1)
+
+    @property
+    def shared(self) -> bool:
+        return self.shared_memory is not None
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def set(self) -> None:
+        self.flag[0] = 1
+
+    def clear(self) -> None:
+        self.flag[0] = 0
+
+    def is_set(self) -> bool:
+        return self.flag[0] == 1
+
+    def close(self) -> None:
+        """Detaches from the shared memory, which is freed if this process owns it."""
+        if self.shared:
+            self._finalizer()
+
+    def __reduce__(self):
+        # Only a shared token is the same flag once sent to another process
+        if not self.shared:
+            raise TypeError('Only a StopToken created with shared=True can be sent to another process')
+        return StopToken, (False, self.name)
+
+
+def release_stop_token(shared_memory: SharedMemory, owner: bool) -> None:
+    shared_memory.close()
+    if owner:
+        shared_memory.unlink()
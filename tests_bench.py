@@ -0,0 +1,20 @@
+import copy
+
+from maxoul_chess.bench import run_bench, compare
+
+
+def test_quick_bench_and_compare():
+    results = run_bench(quick=True, repeat=1)
+    assert results['summary']['perft_ok']
+    assert all(result['nodes'] > 0 and len(result['time_to_depth']) == result['depth']
+               for result in results['search'])
+    assert compare(results, results) == []
+
+    regressed = copy.deepcopy(results)
+    regressed['perft'][0].update(nodes=1, ok=False)
+    regressed['search'][0]['nodes'] *= 2
+    regressed['summary']['search_nps'] //= 2
+    regressed['puzzles'][0]['solved'] = False
+    regressions = compare(regressed, results, tolerance=0.1)
+    assert len(regressions) == 4
+    assert regressions[0].startswith('perft start')
@@ -1,6 +1,17 @@
+import json
+import threading
+import time
+
 import chess
+from maxoul_chess import negamax
 from maxoul_chess.search import min_max_search
+from maxoul_chess.transposition_table import TranspositionTable
+from maxoul_chess.search_stats import SearchStats, ListSink, JsonLinesSink
+from maxoul_chess.legal_moves_generation import MoveOrderingHeuristics
 from maxoul_chess.python_chess_board import PythonChessBoard
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.bot import MaxoulBot
+from maxoul_chess.time_manager import TimeManager
 
 # Puzzle from lichess (thanks !)
 # Black turn here
@@ -23,18 +34,18 @@ best_move_5 = chess.Move.from_uci("c6b5")
 fen_6 = "2k2r2/R7/3b4/1R6/n5N1/5PP1/P4PK1/3r4 b - - 2 45"
 
 
-def get_best_move(fen, depth, pruning, capture_max_depth):
-    board = PythonChessBoard(fen=fen)
+def get_best_move(fen, depth, pruning, capture_max_depth, board_class=PythonChessBoard):
+    board = board_class(fen=fen)
     move = min_max_search(board,
                           depth=depth,
-                          maximizing_player=(board.board.turn == chess.WHITE),
+                          maximizing_player=(board.turn == chess.WHITE),
                           capture_max_depth=capture_max_depth,
                           pruning=pruning)[1]
     return move
 
 
-def do_test_puzzle(fen, best_move, depth, pruning, capture_max_depth):
-    engine_move = get_best_move(fen, depth, pruning, capture_max_depth)
+def do_test_puzzle(fen, best_move, depth, pruning, capture_max_depth, board_class=PythonChessBoard):
+    engine_move = get_best_move(fen, depth, pruning, capture_max_depth, board_class=board_class)
     assert engine_move == best_move, f"{engine_move} vs {best_move}"
 
 
@@ -71,6 +82,340 @@ def test_puzzle_5():
     do_test_puzzle(fen_5, best_move_5, depth=7, pruning=True, capture_max_depth=0)
 
 
+def test_puzzles_bitboard_board():
+    do_test_puzzle(fen_1, best_move_1, depth=2, pruning=True, capture_max_depth=0, board_class=BitboardChessBoard)
+    do_test_puzzle(fen_2, best_move_2, depth=5, pruning=True, capture_max_depth=0, board_class=BitboardChessBoard)
+    do_test_puzzle(fen_3, best_move_3, depth=2, pruning=True, capture_max_depth=2, board_class=BitboardChessBoard)
+    do_test_puzzle(fen_4, best_move_4, depth=4, pruning=True, capture_max_depth=0, board_class=BitboardChessBoard)
+
+
+def iterative_deepening_node_count(fen, max_depth, use_search_cache):
+    board = BitboardChessBoard(fen=fen)
+    tt = TranspositionTable(size_mb=4)
+    stats = SearchStats()
+    best_move = None
+    for depth in range(1, max_depth + 1):
+        best_move = min_max_search(board,
+                                   depth=depth,
+                                   maximizing_player=(board.turn == chess.WHITE),
+                                   capture_max_depth=2,
+                                   candidate_best_move=best_move,
+                                   use_search_cache=use_search_cache,
+                                   use_pv_cache=True,
+                                   tt=tt,
+                                   stats=stats)[1]
+    return best_move, stats.nodes
+
+
+def test_search_cache_reduces_nodes():
+    # Bound aware probing: same moves as without the cache, on fewer nodes
+    for fen, best_move in [(fen_2, best_move_2), (fen_4, best_move_4)]:
+        move_without_cache, nodes_without_cache = iterative_deepening_node_count(fen, 4, use_search_cache=False)
+        move_with_cache, nodes_with_cache = iterative_deepening_node_count(fen, 4, use_search_cache=True)
+        assert move_without_cache == move_with_cache == best_move
+        assert nodes_with_cache < nodes_without_cache
+
+
+def test_principal_variation_search_keeps_minimax_score():
+    # The null window searches must not change the value of the root compared to a plain minimax
+    for fen in [fen_2, fen_3, fen_4]:
+        board = BitboardChessBoard(fen=fen)
+        full_minimax = min_max_search(board, depth=3, maximizing_player=(board.turn == chess.WHITE),
+                                      capture_max_depth=1, pruning=False)
+        pvs = min_max_search(board, depth=3, maximizing_player=(board.turn == chess.WHITE),
+                             capture_max_depth=1, pruning=True)
+        assert pvs[0] == full_minimax[0]
+
+
+def test_killer_and_history_updates():
+    heuristics = MoveOrderingHeuristics()
+    e4, d4 = chess.Move.from_uci('e2e4'), chess.Move.from_uci('d2d4')
+    heuristics.update(e4, ply=2, depth=3)
+    heuristics.update(d4, ply=2, depth=2)
+    heuristics.update(d4, ply=2, depth=2)  # already the first killer, not duplicated
+    assert heuristics.get_killers(2) == [d4, e4]
+    assert heuristics.get_killers(3) == [None, None]
+    assert heuristics.history_score(e4) == 9 and heuristics.history_score(d4) == 8
+    heuristics.age()
+    assert heuristics.history_score(e4) == 4
+    heuristics.shift(2)  # two plies were played since
+    assert heuristics.get_killers(0) == [d4, e4] and heuristics.get_killers(2) == [None, None]
+    heuristics.clear()
+    assert heuristics.get_killers(2) == [None, None] and heuristics.history_score(d4) == 0
+
+
+def test_search_with_move_ordering_heuristics_finds_puzzle_move():
+    board = BitboardChessBoard(fen=fen_4)
+    heuristics = MoveOrderingHeuristics()
+    best_move = None
+    for depth in range(1, 5):
+        heuristics.age()
+        best_move = min_max_search(board, depth=depth, maximizing_player=(board.turn == chess.WHITE),
+                                   capture_max_depth=2, candidate_best_move=best_move, use_pv_cache=True,
+                                   tt=TranspositionTable(size_mb=4), heuristics=heuristics)[1]
+    assert best_move == best_move_4
+
+
+def test_quiescence_bounds_with_delta_pruning():
+    # After 1... Rxf5+ 2. Qxf5, Nxf5 is delta pruned with a high alpha: the score must stay an upper bound
+    board = BitboardChessBoard(fen=fen_2)
+    board.push(chess.Move.from_uci('c5f5'))
+    board.push(chess.Move.from_uci('f6f5'))
+    exact_score = negamax.quiescence(board, 2, -float('inf'), float('inf'), -1)
+    stats = SearchStats()
+    fail_low_score = negamax.quiescence(board, 2, 797.5, 798.5, -1, stats=stats)
+    assert exact_score <= fail_low_score <= 797.5
+    assert stats.q_nodes == 1
+
+
+def test_search_sees_draws_by_repetition():
+    # A queen down, black draws by going back to g8: the position after f6g8 was already reached twice
+    board = BitboardChessBoard(fen='4k1n1/8/8/8/8/8/Q7/4K1N1 w - - 0 1')
+    for uci in ('g1f3', 'g8f6', 'f3g1', 'f6g8', 'g1f3', 'g8f6', 'f3g1'):
+        board.push(chess.Move.from_uci(uci))
+    assert negamax.negamax_search(board, depth=1, maximizing_player=False) == (0, chess.Move.from_uci('f6g8'), False)
+    assert negamax.quiescence(board, 2, -float('inf'), float('inf'), -1, ply=1) == 0
+    # No cutoff at the root on a score stored for the same position reached without the repetition
+    tt = TranspositionTable(size_mb=1)
+    negamax.negamax_search(BitboardChessBoard(fen=board.fen()), depth=2, maximizing_player=False,
+                           use_search_cache=True, tt=tt)
+    assert negamax.negamax_search(board, depth=2, maximizing_player=False, use_search_cache=True,
+                                  tt=tt)[:2] == (0, chess.Move.from_uci('f6g8'))
+
+
+def test_root_split_search_matches_sequential_search():
+    pool = negamax.create_root_split_pool(2, tt_mb=1)
+    # The last two: many root moves beat the first one, so the null window fail highs come back while alpha rises
+    fens = [fen_2, fen_4, fen_6, 'r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4',
+            'k7/8/1K6/8/8/8/8/6Q1 w - - 0 1']
+    for fen in fens:
+        board = BitboardChessBoard(fen=fen)
+        for depth in (3, 4):
+            sequential = min_max_search(board, depth=depth, maximizing_player=(board.turn == chess.WHITE),
+                                        capture_max_depth=1)
+            root_split = min_max_search(board, depth=depth, maximizing_player=(board.turn == chess.WHITE),
+                                        capture_max_depth=1, executor=pool)
+            assert root_split[0] == sequential[0]
+            # Among moves of equal score, the one played depends on which search completes first
+            if root_split[1] != sequential[1]:
+                color = 1 if board.turn == chess.WHITE else -1
+                board.push(root_split[1])
+                score = -negamax.negamax(board, depth - 1, -float('inf'), float('inf'), -color, capture_max_depth=1)[0]
+                board.pop()
+                assert color * score == sequential[0]
+    pool.shutdown()
+
+
+class Clock:
+    white_clock = 10
+    black_clock = 10
+    white_inc = 0
+    black_inc = 0
+
+
+def test_pondering_hit_reuses_completed_depths():
+    bot = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1, ponder=True)
+    board = chess.Board(fen_4)
+    board.push(bot.play_time_opt(board, Clock()))
+    expected_reply = bot.ponder_move
+    assert expected_reply in board.legal_moves
+    for process in bot.ponder_search.processes:
+        process.join(timeout=10)  # max_depth is reached quickly
+    board.push(expected_reply)
+    move = bot.play_time_opt(board, Clock(), ponder=False)
+    assert bot.n_ponder_hits == 1
+    assert move in board.legal_moves
+    bot.close()
+
+
+def test_pondering_miss_is_cancelled():
+    bot = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1, ponder=True)
+    board = chess.Board(fen_4)
+    board.push(bot.play_time_opt(board, Clock()))
+    process = bot.ponder_search.processes[0]
+    board.push(next(move for move in board.legal_moves if move != bot.ponder_move))
+    move = bot.play_time_opt(board, Clock(), ponder=False)
+    assert bot.n_ponder_hits == 0 and bot.ponder_search is None
+    assert not process.is_alive()
+    assert move in board.legal_moves
+    bot.close()
+
+
+def test_search_context_carries_over_moves():
+    bot = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1)
+    board = chess.Board(fen_4)
+    board.push(bot.play_time_opt(board, Clock()))
+    expected_reply = bot.context.expected_reply()
+    assert expected_reply in board.legal_moves
+    board.push(expected_reply)
+    assert bot.context.is_same_game(board)
+    assert not bot.context.is_same_game(chess.Board())
+    # The position expected after our move was searched as part of the principal variation
+    proven_depth, _, proven_move = bot.context.proven_result(BitboardChessBoard(board=board))
+    assert proven_depth >= 1 and proven_move in board.legal_moves
+    assert bot.play_time_opt(board, Clock()) in board.legal_moves
+
+
+def test_search_stats_sink_without_prints(capsys):
+    sink = ListSink()
+    bot = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1, verbose=False, stats_sink=sink)
+    board = chess.Board(fen_4)
+    move = bot.play_time_opt(board, Clock())
+    assert capsys.readouterr().out == ''
+
+    stats = sink.stats[0]
+    assert stats is bot.last_stats
+    assert stats.info['move'] == move.uci() and stats.info['depth'] == 3
+    assert [depth for depth, _, _ in stats.depths] == [1, 2, 3]
+    assert stats.nodes > 0 and stats.q_nodes > 0 and stats.nps > 0
+    assert 0 < stats.tt_hits <= stats.tt_probes
+    assert 0 < stats.first_move_cutoffs <= stats.beta_cutoffs
+    assert stats.branching_factor > 1
+
+    JsonLinesSink()(stats)
+    assert json.loads(capsys.readouterr().out)['nodes'] == stats.nodes
+
+
+def test_null_move_pruning_and_late_move_reductions():
+    puzzles = [(fen_1, best_move_1, 2), (fen_2, best_move_2, 5), (fen_3, best_move_3, 4), (fen_4, best_move_4, 4),
+               (fen_5, best_move_5, 7)]
+    for fen, best_move, depth in puzzles:
+        board = BitboardChessBoard(fen=fen)
+        tt = TranspositionTable(size_mb=1)
+        stats = SearchStats()
+        move = None
+        for current_depth in range(1, depth + 1):
+            move = negamax.negamax_search(board, depth=current_depth, maximizing_player=(board.turn == chess.WHITE),
+                                          capture_max_depth=2, candidate_best_move=move, use_search_cache=True,
+                                          use_pv_cache=True, tt=tt, stats=stats,
+                                          null_move=True, late_move_reductions=True)[1]
+        assert move == best_move, fen
+        if fen == fen_5:
+            # Pawn endgame: zugzwang is likely, the null move is never tried and no move is reduced
+            assert stats.null_move_cutoffs == 0 and stats.reduced_moves == 0
+        elif fen == fen_4:
+            assert stats.null_move_cutoffs > 0 and stats.reduced_moves > 0
+
+
+def test_mate_scores_count_the_plies_to_mate():
+    # Back rank mate in 1 for white, found with the same score at every depth, through the table too
+    board = BitboardChessBoard(fen='6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1')
+    tt = TranspositionTable(size_mb=1)
+    for depth in range(1, 5):
+        score, move, _ = negamax.negamax_search(board, depth=depth, capture_max_depth=2, use_search_cache=True,
+                                                use_pv_cache=True, tt=tt, null_move=True, late_move_reductions=True)
+        assert move == chess.Move.from_uci('d1d8') and score == negamax.MATE_SCORE - 1
+        assert negamax.plies_to_mate(score) == 1
+
+    # Black to move is mated in 2 plies: Kb8 Rh8#
+    board = BitboardChessBoard(fen='k7/8/1K6/8/8/8/8/7R b - - 0 1')
+    score = negamax.negamax_search(board, depth=4, maximizing_player=False, capture_max_depth=2)[0]
+    assert score == negamax.MATE_SCORE - 2
+    assert negamax.score_from_tt(negamax.score_to_tt(-negamax.MATE_SCORE + 5, 3), 3) == -negamax.MATE_SCORE + 5
+    assert negamax.plies_to_mate(350) is None
+
+
+def test_bot_stops_once_mate_is_found():
+    sink = ListSink()
+    bot = MaxoulBot(max_depth=6, capture_max_depth=2, tt_mb=1, verbose=False, stats_sink=sink)
+    move = bot.play_time_opt(chess.Board('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1'), Clock())
+    assert move == chess.Move.from_uci('d1d8')
+    assert sink.stats[0].info['depth'] == 1
+
+
+def test_aspiration_widens_the_failing_side():
+    board = chess.Board(fen_4)
+    end_time = time.time() + 60
+    reference = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1, verbose=False)
+    _, exact_eval, _ = reference.run_time_limited_search(-float('inf'), float('inf'), depth=3, best_move=None,
+                                                         best_eval=None, maxoul_board=BitboardChessBoard(board=board),
+                                                         end_time=end_time, stats=SearchStats())
+    for guess, white_side in ((exact_eval + 500, 'fail_lows'), (exact_eval - 500, 'fail_highs')):
+        bot = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1, verbose=False)
+        stats = SearchStats()
+        _, new_eval, _ = bot.aspiration_search(3, best_move=None, best_eval=guess,
+                                               maxoul_board=BitboardChessBoard(board=board), end_time=end_time,
+                                               stats=stats)
+        assert new_eval == exact_eval
+        assert stats.aspiration_researches > 0
+        # Black to move: the counters are from its point of view
+        black_side = 'fail_highs' if white_side == 'fail_lows' else 'fail_lows'
+        assert getattr(stats, black_side) == stats.aspiration_researches
+        assert getattr(stats, white_side) == 0
+
+
+class OneSearchBot(MaxoulBot):
+    """Bot whose time runs out right after the first aspiration search."""
+    def run_time_limited_search(self, *args, **kwargs):
+        self.searched = super().run_time_limited_search(*args, **kwargs)
+        kwargs['stats'].cancelled = True
+        return self.searched
+
+
+def test_aspiration_keeps_the_move_of_the_side_to_move():
+    board = chess.Board(fen_4)
+    end_time = time.time() + 60
+    reference = MaxoulBot(max_depth=3, capture_max_depth=2, tt_mb=1, verbose=False)
+    exact_move, exact_eval, _ = reference.run_time_limited_search(-float('inf'), float('inf'), depth=3,
+                                                                  best_move=None, best_eval=None,
+                                                                  maxoul_board=BitboardChessBoard(board=board),
+                                                                  end_time=end_time, stats=SearchStats())
+    previous_move = next(move for move in board.legal_moves if move != exact_move)
+    # Black to move: a score above the window is a fail low for black, one below it a fail high
+    for guess, black_fails_high in ((exact_eval - 500, False), (exact_eval + 500, True)):
+        bot = OneSearchBot(max_depth=3, capture_max_depth=2, tt_mb=1, verbose=False)
+        move, new_eval, _ = bot.aspiration_search(3, best_move=previous_move, best_eval=guess,
+                                                  maxoul_board=BitboardChessBoard(board=board), end_time=end_time,
+                                                  stats=SearchStats())
+        if black_fails_high:
+            assert (move, new_eval) == bot.searched[:2] and new_eval < guess
+        else:
+            assert (move, new_eval) == (previous_move, guess)
+        assert move in board.legal_moves
+
+
+def test_time_manager_limits():
+    manager = TimeManager(soft_limit=2, time_left=60, increment=0, start_time=0)
+    assert manager.hard_limit == 6 and manager.optimum == 2
+    # Bounded by the clock left
+    assert TimeManager(soft_limit=2, time_left=10).hard_limit == 3
+    e2e4, d2d4 = chess.Move.from_uci('e2e4'), chess.Move.from_uci('d2d4')
+    manager.update(e2e4, 0.5)
+    manager.update(d2d4, 0.5)
+    assert manager.optimum > 2  # the best move changed: more time
+    for _ in range(6):
+        manager.update(d2d4, 0.5)
+    assert manager.optimum < 2  # stable
+    stable_optimum = manager.optimum
+    manager.update(d2d4, 0.95)
+    assert manager.optimum < stable_optimum  # all the effort went into the best move
+
+
+def test_search_cancelled_within_a_few_nodes():
+    board = BitboardChessBoard(fen=fen_4)
+    stats = SearchStats()
+    t0 = time.time()
+    _, move, cancelled = negamax.negamax_search(board, depth=12, maximizing_player=False, capture_max_depth=2,
+                                                max_end_time=t0 + 0.2, use_search_cache=True, use_pv_cache=True,
+                                                tt=TranspositionTable(size_mb=1), stats=stats, null_move=True,
+                                                late_move_reductions=True)
+    assert cancelled and stats.cancelled
+    assert time.time() - t0 < 1
+    assert board.fen() == fen_4
+
+
+def test_stop_from_another_thread():
+    bot = MaxoulBot(max_depth=30, capture_max_depth=2, tt_mb=1, verbose=False)
+    board = chess.Board(fen_4)
+    t0 = time.time()
+    threading.Timer(0.3, bot.stop).start()
+    move = bot.play_time_opt(board, Clock())  # 3.6 seconds allowed
+    assert time.time() - t0 < 1
+    assert move in board.legal_moves
+    assert bot.last_stats.cancelled and not bot.stop_token.is_set()
+    bot.close()
+
+
 if __name__ == '__main__':
     #
     # # # for i in range(1, 7):•
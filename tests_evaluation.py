@@ -0,0 +1,69 @@
+import random
+
+import chess
+import pytest
+
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.evaluation import evaluate_material, evaluate_material_incremental, evaluate_batch
+from maxoul_chess.legal_moves_generation import move_priority_bis, move_priorities_batch
+from maxoul_chess.piece_position_values import pst_index, pst_beginning, pst_endgame, beginning_square_sets_white, \
+    beginning_square_sets_black, endgame_square_sets_white, endgame_square_sets_black
+
+
+def random_boards(n_games, max_ply, seed=0):
+    random.seed(seed)
+    for _ in range(n_games):
+        board = BitboardChessBoard()
+        for _ in range(max_ply):
+            moves = board.generate_legal_moves()
+            if len(moves) == 0:
+                break
+            board.push(random.choice(moves))
+            yield board
+
+
+def test_incremental_evaluation_matches_full_evaluation():
+    for board in random_boards(n_games=30, max_ply=150):
+        assert evaluate_material_incremental(board) == pytest.approx(evaluate_material(board))
+
+
+def test_incremental_evaluation_restored_by_pop():
+    # Promotions, castling and en passant all update the accumulators, pop must undo each of them
+    board = BitboardChessBoard(fen='r3k2r/pPppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    initial_evaluation = evaluate_material_incremental(board)
+    for move in board.generate_legal_moves():
+        board.push(move)
+        assert evaluate_material_incremental(board) == pytest.approx(evaluate_material(board))
+        for reply in board.generate_legal_moves():
+            board.push(reply)
+            assert evaluate_material_incremental(board) == pytest.approx(evaluate_material(board))
+            board.pop()
+        board.pop()
+    assert evaluate_material_incremental(board) == initial_evaluation
+
+
+def test_batch_evaluation_matches_incremental_evaluation():
+    boards, expected = [], []
+    for board in random_boards(n_games=10, max_ply=150, seed=1):
+        boards.append(BitboardChessBoard(fen=board.fen()))
+        expected.append(evaluate_material_incremental(board))
+    assert evaluate_batch(boards).tolist() == pytest.approx(expected)
+    assert len(evaluate_batch([])) == 0
+
+
+def test_batch_move_priorities():
+    board = BitboardChessBoard(fen='r2qkb1r/pp3ppp/2n1bn2/1Bp1N3/4P3/2N5/PPPP2PP/R1BQ1RK1 b kq - 0 8')
+    moves = board.generate_legal_moves()
+    assert move_priorities_batch(moves, board) == pytest.approx([move_priority_bis(move, board) for move in moves])
+    assert move_priorities_batch([], board) == []
+
+
+def test_flat_piece_square_tables():
+    for piece_type in range(1, 7):
+        for color, beginning, endgame in ((chess.WHITE, beginning_square_sets_white, endgame_square_sets_white),
+                                          (chess.BLACK, beginning_square_sets_black, endgame_square_sets_black)):
+            offset = pst_index(piece_type, color)
+            assert pst_beginning[offset: offset + 64] == beginning[piece_type].tolist()
+            assert pst_endgame[offset: offset + 64] == endgame[piece_type].tolist()
+    assert all(type(value) is int for value in pst_beginning + pst_endgame)
+    assert type(evaluate_material(BitboardChessBoard())) is int
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import chess
+
+from maxoul_chess.game_server import GameManager, GameServer, StubClient
+
+
+def test_server_plays_concurrent_games():
+    async def run():
+        manager = GameManager(n_workers=2, bot_options=dict(max_depth=2, capture_max_depth=2, tt_mb=1))
+        server = GameServer(manager)
+        port = await server.start()
+        client = StubClient()
+        await client.connect('127.0.0.1', port)
+
+        game_ids = ['a', 'b', 'c']
+        boards = {game_id: chess.Board() for game_id in game_ids}
+        for _ in range(2):
+            moves = await asyncio.gather(*[
+                client.request_move(game_id, [move.uci() for move in boards[game_id].move_stack],
+                                    white_clock=5, black_clock=5, white_inc=0, black_inc=0)
+                for game_id in game_ids])
+            for game_id, uci in zip(game_ids, moves):
+                assert chess.Move.from_uci(uci) in boards[game_id].legal_moves
+                boards[game_id].push_uci(uci)
+
+        # The games were shared out over both workers
+        assert sorted(manager.n_games) == [1, 2]
+        assert await client.end_game('a')
+        assert not await client.end_game('a')
+        await client.close()
+        await server.close()
+        manager.shutdown()
+
+    asyncio.run(run())
+
+
+def test_server_reports_bad_requests():
+    async def run():
+        manager = GameManager(n_workers=1, bot_options=dict(max_depth=1, tt_mb=1))
+        server = GameServer(manager)
+        port = await server.start()
+        client = StubClient()
+        await client.connect('127.0.0.1', port)
+        try:
+            await client.request_move('a', ['e2e5'])
+            raised = False
+        except RuntimeError:
+            raised = True
+        assert raised
+        await client.close()
+        await server.close()
+        manager.shutdown()
+
+    asyncio.run(run())
+
+
+def test_ending_a_game_stops_its_search():
+    async def run():
+        manager = GameManager(n_workers=1, bot_options=dict(max_depth=30, capture_max_depth=2, tt_mb=1,
+                                                            verbose=False))
+        server = GameServer(manager)
+        port = await server.start()
+        client = StubClient()
+        await client.connect('127.0.0.1', port)
+        # About 30 seconds allowed for the move
+        move_request = asyncio.create_task(client.request_move('a', [], white_clock=600, black_clock=600,
+                                                               white_inc=30, black_inc=30))
+        await asyncio.sleep(1)
+        t0 = time.time()
+        assert await client.end_game('a')
+        assert time.time() - t0 < 3
+        assert chess.Move.from_uci(await move_request) in chess.Board().legal_moves
+        await client.close()
+        await server.close()
+        manager.shutdown()
+
+    asyncio.run(run())
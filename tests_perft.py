@@ -1,7 +1,13 @@
+import random
+
+import chess
+import chess.polyglot
 import numpy as np
 
 from maxoul_chess.python_chess_board import PythonChessBoard
-# from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.legal_moves_generation import pick_moves, see, get_quiescence_moves
+from maxoul_chess import perft as perft_tool
 
 
 def perft(board, depth):
@@ -26,16 +32,142 @@ def test_python_chess_board():
     assert perft(b, 4) == 197281
 
 
-# def test_bitboard_chess_board():
-#     b = BitboardChessBoard()
-#     print(str(b.board))
-#     assert perft(b, 0) == 1
-#     assert perft(b, 1) == 20
-#     assert perft(b, 2) == 400
-#     assert perft(b, 3) == 8902
-#     assert perft(b, 4) == 197281
+def test_bitboard_chess_board():
+    b = BitboardChessBoard()
+    assert perft(b, 0) == 1
+    assert perft(b, 1) == 20
+    assert perft(b, 2) == 400
+    assert perft(b, 3) == 8902
+    assert perft(b, 4) == 197281
+    assert b.fen() == chess.STARTING_FEN
+
+
+def test_bitboard_chess_board_kiwipete():
+    # Castling, en passant and promotions all show up quickly from this one
+    b = BitboardChessBoard(fen='r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    assert perft(b, 1) == 48
+    assert perft(b, 2) == 2039
+    assert perft(b, 3) == 97862
+
+
+def test_bitboard_chess_board_endgame():
+    b = BitboardChessBoard(fen='8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1')
+    assert perft(b, 1) == 14
+    assert perft(b, 2) == 191
+    assert perft(b, 3) == 2812
+    assert perft(b, 4) == 43238
+
+
+def test_bitboard_chess_board_matches_python_chess():
+    random.seed(0)
+    for _ in range(20):
+        python_chess_board = chess.Board()
+        b = BitboardChessBoard()
+        while not python_chess_board.is_game_over() and python_chess_board.ply() < 200:
+            assert set(b.generate_legal_moves()) == set(python_chess_board.legal_moves)
+            assert set(b.generate_capture_moves()) == set(python_chess_board.generate_legal_captures())
+            assert b.is_check() == python_chess_board.is_check()
+            assert b.is_repetition() == python_chess_board.is_repetition()
+            assert b.hash() == chess.polyglot.zobrist_hash(python_chess_board)
+            move = random.choice(list(python_chess_board.legal_moves))
+            python_chess_board.push(move)
+            b.push(move)
+        assert b.is_checkmate() == python_chess_board.is_checkmate()
+        assert b.is_stalemate() == python_chess_board.is_stalemate()
+        assert b.is_insufficient_material() == python_chess_board.is_insufficient_material()
+        while python_chess_board.move_stack:
+            python_chess_board.pop()
+            b.pop()
+            assert b.hash() == b.compute_hash() == chess.polyglot.zobrist_hash(python_chess_board)
+
+
+def test_pinned_en_passant_is_hashed_like_polyglot():
+    # bxc6 would expose the king to the rook, chess.polyglot still hashes the en passant file: legality is irrelevant
+    python_chess_board = chess.Board('8/2p5/8/KP5r/8/8/8/7k b - - 0 1')
+    b = BitboardChessBoard(fen=python_chess_board.fen())
+    for board in (python_chess_board, b):
+        board.push(chess.Move.from_uci('c7c5'))
+    assert not python_chess_board.has_legal_en_passant()
+    assert b.hash() == b.compute_hash() == chess.polyglot.zobrist_hash(python_chess_board)
+    assert set(b.generate_legal_moves()) == set(python_chess_board.legal_moves)
+
+
+def test_pick_moves_yields_each_legal_move_once():
+    b = BitboardChessBoard(fen='r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    hash_move = chess.Move.from_uci('e1g1')
+    killer = chess.Move.from_uci('a2a3')
+    picked = list(pick_moves(b, hash_move=hash_move, killers=[killer, chess.Move.from_uci('a2a4')]))
+    assert sorted(picked, key=str) == sorted(b.generate_legal_moves(), key=str)
+    assert picked[0] == hash_move
+    # Captures come before killers, killers before the other quiet moves
+    first_quiet = next(i for i, move in enumerate(picked[1:], 1) if not b.is_capture(move))
+    assert all(b.is_capture(move) for move in picked[1:first_quiet])
+    assert picked[first_quiet: first_quiet + 2] == [killer, chess.Move.from_uci('a2a4')]
+    # Hash moves of another position (key collision) are left out
+    for illegal_move in ('e1c3', 'a1a8', 'c3c4', 'c1c8'):
+        picked = list(pick_moves(b, hash_move=chess.Move.from_uci(illegal_move)))
+        assert sorted(picked, key=str) == sorted(b.generate_legal_moves(), key=str)
+
+
+def test_quiet_and_capture_moves_split_legal_moves():
+    b = BitboardChessBoard(fen='rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3')
+    captures = b.generate_capture_moves()
+    quiets = b.generate_quiet_moves()
+    assert chess.Move.from_uci('e5f6') in captures
+    assert sorted(captures + quiets, key=str) == sorted(b.generate_legal_moves(), key=str)
+    assert not set(captures) & set(quiets)
+
+
+def test_static_exchange_evaluation():
+    positions = [
+        ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', 100),  # undefended pawn
+        ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', -200),
+        ('4k3/8/2p5/3p4/4P3/8/8/4K3 w - - 0 1', 'e4d5', 0),
+        ('3qk3/3r4/8/3p4/8/8/3R4/3QK3 w - - 0 1', 'd2d5', -400),  # x-rays on both sides
+        ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', 100),  # en passant
+        ('1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7a8q', -100),
+    ]
+    for fen, uci, expected_score in positions:
+        move = chess.Move.from_uci(uci)
+        assert see(BitboardChessBoard(fen=fen), move) == expected_score
+        assert see(PythonChessBoard(fen=fen), move) == expected_score
+
+
+def test_quiescence_moves_skip_losing_captures():
+    b = BitboardChessBoard(fen='1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1')
+    assert get_quiescence_moves(b) == []
+    b = BitboardChessBoard(fen='1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1')
+    assert get_quiescence_moves(b) == [chess.Move.from_uci('a7b8q')]
+
+
+def test_bulk_hashed_and_parallel_perft():
+    kiwipete = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1'
+    b = BitboardChessBoard(fen=kiwipete)
+    table = perft_tool.PerftTable(size_mb=1)
+    assert perft_tool.perft(b, 3) == 97862
+    assert perft_tool.perft(b, 3, table) == 97862
+    assert perft_tool.perft(b, 3, table) == 97862 and table.n_gets > 0
+    assert b.fen() == kiwipete
+
+    counts = perft_tool.divide(BitboardChessBoard(), 4, table)
+    assert len(counts) == 20 and sum(counts.values()) == 197281 and counts['e2e4'] == 13160
+    assert perft_tool.parallel_divide(chess.STARTING_FEN, 4, n_workers=2, table_mb=1) == counts
+
+
+def test_bitboard_null_move():
+    python_chess_board = chess.Board('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3')
+    b = BitboardChessBoard(fen=python_chess_board.fen())
+    key = b.hash()
+    b.push_null()
+    python_chess_board.push(chess.Move.null())
+    assert b.turn == chess.BLACK and b.ep_square is None
+    assert b.hash() == b.compute_hash() == chess.polyglot.zobrist_hash(python_chess_board)
+    assert set(b.generate_legal_moves()) == set(python_chess_board.legal_moves)
+    assert not b.is_repetition(2)
+    b.pop_null()
+    assert b.hash() == key and b.fen() == 'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3'
 
 
 if __name__ == '__main__':
     test_python_chess_board()
-    # test_bitboard_chess_board()
+    test_bitboard_chess_board()
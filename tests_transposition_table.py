@@ -0,0 +1,93 @@
+import chess
+import time
+
+from maxoul_chess.bitboard_chess_board import BitboardChessBoard
+from maxoul_chess.search import min_max_search
+from maxoul_chess.lazy_smp import LazySMP
+from maxoul_chess.transposition_table import TranspositionTable, SharedTranspositionTable, EXACT, LOWER_BOUND, \
+    pack_move, unpack_move, n_entries_for_size, ENTRY_SIZE
+
+
+def test_size_is_a_power_of_two_within_budget():
+    tt = TranspositionTable(size_mb=1)
+    assert tt.n_entries == n_entries_for_size(1)
+    assert tt.n_entries & (tt.n_entries - 1) == 0
+    assert tt.n_entries * ENTRY_SIZE <= 1024 * 1024 < 2 * tt.n_entries * ENTRY_SIZE
+
+
+def test_pack_move():
+    for move in [chess.Move.from_uci('e2e4'), chess.Move.from_uci('a7a8q'), chess.Move.from_uci('h2h1n')]:
+        assert unpack_move(pack_move(move)) == move
+    assert unpack_move(pack_move(None)) is None
+
+
+def test_store_and_probe():
+    tt = TranspositionTable(size_mb=1)
+    key = BitboardChessBoard().hash()
+    move = chess.Move.from_uci('e2e4')
+    assert tt.probe(key) is None
+    tt.store(key, 3, 12.5, EXACT, move)
+    assert tt.probe(key) == (3, 12.5, EXACT, move)
+    # A different key landing on the same slot is not mistaken for our position
+    assert tt.probe(key + tt.n_entries) is None
+
+
+def test_replacement_prefers_depth_then_age():
+    tt = TranspositionTable(size_mb=1)
+    key = 123456789
+    other_key = key + tt.n_entries  # same slot
+    tt.store(key, 5, 1., EXACT, chess.Move.from_uci('e2e4'))
+    tt.store(other_key, 2, 2., LOWER_BOUND, None)
+    assert tt.probe(key)[0] == 5
+    tt.new_search()
+    tt.store(other_key, 2, 2., LOWER_BOUND, None)
+    assert tt.probe(key) is None
+    assert tt.probe(other_key) == (2, 2., LOWER_BOUND, None)
+
+
+def test_search_with_transposition_table_finds_puzzle_move():
+    board = BitboardChessBoard(fen="8/1p3p2/1Pkn1Q2/2r2P1P/8/5K2/8/8 b - - 0 63")
+    tt = TranspositionTable(size_mb=4)
+    move = min_max_search(board, depth=4, maximizing_player=False, capture_max_depth=0,
+                          use_pv_cache=True, tt=tt)[1]
+    assert move == chess.Move.from_uci('c5f5')
+    assert tt.n_stores > 0
+
+
+def test_root_search_returns_a_move_despite_a_cutoff_entry():
+    # Null-move cutoffs store a lower bound without a move: at the root it must not cut the search
+    board = BitboardChessBoard(fen="8/1p3p2/1Pkn1Q2/2r2P1P/8/5K2/8/8 b - - 0 63")
+    tt = TranspositionTable(size_mb=1)
+    tt.store(board.hash(), 10, 500., LOWER_BOUND, None)
+    move = min_max_search(board, depth=2, maximizing_player=False, alpha=-100, beta=100, use_search_cache=True,
+                          tt=tt)[1]
+    assert move in board.generate_legal_moves()
+
+
+def test_shared_table_attached_by_name():
+    tt = SharedTranspositionTable(size_mb=1)
+    other = SharedTranspositionTable(size_mb=1, name=tt.name)
+    key = BitboardChessBoard().hash()
+    tt.store(key, 3, 12.5, EXACT, chess.Move.from_uci('e2e4'))
+    assert other.probe(key) == (3, 12.5, EXACT, chess.Move.from_uci('e2e4'))
+    # An entry torn by a concurrent write no longer matches its key
+    other.scores[key & other.mask] = -7.
+    assert tt.probe(key) is None
+    other.close()
+    tt.close()
+
+
+def test_lazy_smp_helpers_report_completed_depths():
+    fen = "8/1p3p2/1Pkn1Q2/2r2P1P/8/5K2/8/8 b - - 0 63"
+    tt = SharedTranspositionTable(size_mb=1)
+    lazy_smp = LazySMP(2, tt)
+    lazy_smp.start(chess.Board(fen), max_depth=3,
+                   end_time=time.time() + 30, capture_max_depth=0, pruning=True)
+    for process in lazy_smp.processes:
+        process.join()
+    results = lazy_smp.stop()
+    assert max(depth for depth, _, _, _ in results) == 3
+    assert all(move == chess.Move.from_uci('c5f5') for depth, _, move, _ in results if depth == 3)
+    # The helpers wrote the root position to the table of this process
+    assert tt.probe_move(BitboardChessBoard(fen=fen).hash()) == chess.Move.from_uci('c5f5')
+    tt.close()
@@ -0,0 +1,87 @@
+"""
+Time management of one move of the bot.
+
+The soft limit is the time the move should take: no new depth is started when it would most likely end past it. It
+is stretched while the best move keeps changing from one depth to the next, and shortened once the best move is
+stable, or when most of the nodes of the last depth went into the best move (the other moves were refuted quickly).
+The hard limit is where the search is cancelled, to let a depth started within the soft limit finish.
+"""
+import time
+from beartype.typing import Optional
+from chess import Move
+
+# Hard limit: at most this many times the soft limit, and at most this fraction of the clock left
+HARD_LIMIT_FACTOR = 3
+MAX_CLOCK_FRACTION = 0.3
+
+# Estimate of the duration of the next depth, from the duration of the last one
+NEXT_DEPTH_FACTOR = 2
+
+# Best move changes: each change stretches the soft limit by INSTABILITY_WEIGHT, halved at each depth
+INSTABILITY_WEIGHT = 1.
+INSTABILITY_DECAY = 0.5
+
+# Best move unchanged for STABLE_DEPTHS depths in a row: the soft limit is multiplied by STABLE_FACTOR
+STABLE_DEPTHS = 4
+STABLE_FACTOR = 0.7
+
+# Fraction of the root nodes spent on the best move above which the soft limit is multiplied by EFFORT_FACTOR
+EFFORT_THRESHOLD = 0.9
+EFFORT_FACTOR = 0.6
+
+# Bounds of the factor applied to the soft limit
+MIN_SCALE = 0.4
+MAX_SCALE = 2.5
+
+
+class TimeManager:
+    def __init__(self, soft_limit: float, time_left: float, increment: float = 0, start_time: float = None):
+        """
+        :param soft_limit: seconds the move should take, e.g. MaxoulBot.time_allowance.
+        :param time_left: clock of the side to move, in seconds, bounding the hard limit.
+        """
+        self.start_time = time.time() if start_time is None else start_time
+        self.soft_limit = soft_limit
+        self.hard_limit = max(soft_limit, min(HARD_LIMIT_FACTOR * soft_limit,
+                                              MAX_CLOCK_FRACTION * time_left + 0.8 * increment))
+        self.hard_end_time = self.start_time + self.hard_limit
+        self.best_move: Optional[Move] = None
+        self.stable_depths = 0
+        self.instability = 0.
+        self.effort = 0.
+
+    def elapsed(self) -> float:
+        return time.time() - self.start_time
+
+    def update(self, best_move: Move, best_move_effort: float) -> None:
+        """After each depth, with its best move and the fraction of the root nodes spent on it."""
+        self.instability *= INSTABILITY_DECAY
+        if self.best_move is not None and best_move != self.best_move:
+            self.instability += 1
+            self.stable_depths = 0
+        else:
+            self.stable_depths += 1
+        self.best_move = best_move
+        self.effort = best_move_effort
+
+    @property
+    def scale(self) -> float:
+        """Factor applied to the soft limit."""
+        scale = 1 + INSTABILITY_WEIGHT * self.instability
+        if self.stable_depths >= STABLE_DEPTHS:
+            scale *= STABLE_FACTOR
+        if self.effort >= EFFORT_THRESHOLD:
+            scale *= EFFORT_FACTOR
+        return min(max(scale, MIN_SCALE), MAX_SCALE)
+
+    @property
+    def optimum(self) -> float:
+        """Soft limit scaled by the stability of the best move, never past the hard limit."""
+        return min(self.soft_limit * self.scale, self.hard_limit)
+
+    def should_stop(self, depth_duration: float) -> bool:
+        """Whether to stop before the next depth, given the duration of the last one."""
+        return self.elapsed() + NEXT_DEPTH_FACTOR * depth_duration > self.optimum
+
+    def __repr__(self):
+        return f'TimeManager(soft {self.soft_limit:.2f}s, hard {self.hard_limit:.2f}s, scale {self.scale:.2f})'
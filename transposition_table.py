@@ -0,0 +1,237 @@
+"""
+Fixed-size transposition tables, indexed by the 64 bits zobrist key of the position.
+
+All the entries live in one preallocated buffer (split in one typed array per field), so probing or storing never
+allocates and the memory used is known upfront. The buffer can be any writable bytes-like object, which lets several
+processes share a table through multiprocessing.shared_memory.
+"""
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+from beartype.typing import Optional, Tuple
+from chess import Move
+
+# Bound types
+EXACT = 0
+LOWER_BOUND = 1  # the score failed high: the true score is >= stored score
+UPPER_BOUND = 2  # the score failed low: the true score is <= stored score
+
+# Bytes used by one entry: key (8), score (8), move (2), depth (1), bound (1), age (1)
+ENTRY_SIZE = 21
+
+
+def pack_move(move: Optional[Move]) -> int:
+    if move is None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def unpack_move(packed_move: int) -> Optional[Move]:
+    if packed_move == 0:
+        return None
+    return Move(packed_move & 63, (packed_move >> 6) & 63, (packed_move >> 12) or None)
+
+
+def n_entries_for_size(size_mb: float) -> int:
+    """Largest power of two number of entries fitting in size_mb megabytes."""
+    n_entries = 1
+    while 2 * n_entries * ENTRY_SIZE <= size_mb * 1024 * 1024:
+        n_entries *= 2
+    return max(n_entries, 8)
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: float = 64, buffer=None):
+        """
+        :param size_mb: memory budget of the table.
+        :param buffer: optional writable buffer of at least n_entries_for_size(size_mb) * ENTRY_SIZE bytes holding
+        the entries (e.g. a SharedMemory.buf). A private zeroed buffer is allocated otherwise.
+        """
+        self.size_mb = size_mb
+        self.n_entries = n_entries_for_size(size_mb)
+        self.mask = self.n_entries - 1
+        if buffer is None:
+            buffer = bytearray(self.n_entries * ENTRY_SIZE)
+        self._attach(buffer)
+        self.age = 0
+        self.n_probes = 0
+        self.n_hits = 0
+        self.n_stores = 0
+
+    def _attach(self, buffer):
+        n = self.n_entries
+        view = memoryview(buffer)
+        self.buffer = buffer
+        self.keys = view[0: 8 * n].cast('Q')
+        self.scores = view[8 * n: 16 * n].cast('d')
+        self.moves = view[16 * n: 18 * n].cast('H')
+        self.depths = view[18 * n: 19 * n].cast('b')
+        self.bounds = view[19 * n: 20 * n].cast('B')
+        self.ages = view[20 * n: 21 * n].cast('B')
+
+    def probe(self, key: int) -> Optional[Tuple[int, float, int, Optional[Move]]]:
+        """
+        :return: (depth, score, bound, best move) stored for this key, or None.
+        """
+        self.n_probes += 1
+        index = key & self.mask
+        # Empty slots have a zero key, which no real position hashes to in practice
+        if self.keys[index] != key:
+            return None
+        self.n_hits += 1
+        return self.depths[index], self.scores[index], self.bounds[index], unpack_move(self.moves[index])
+
+    def probe_move(self, key: int) -> Optional[Move]:
+        index = key & self.mask
+        if self.keys[index] != key:
+            return None
+        return unpack_move(self.moves[index])
+
+    def store(self, key: int, depth: int, score: float, bound: int, move: Optional[Move]) -> None:
+        index = key & self.mask
+        same_position = self.keys[index] == key
+        # Replacement scheme: entries from previous searches and shallower entries go first
+        if same_position or self.ages[index] != self.age or depth >= self.depths[index]:
+            packed_move = pack_move(move)
+            if same_position and packed_move == 0:
+                packed_move = self.moves[index]  # keep the best move we already knew
+            self.keys[index] = key
+            self.scores[index] = score
+            self.moves[index] = packed_move
+            self.depths[index] = depth
+            self.bounds[index] = bound
+            self.ages[index] = self.age
+            self.n_stores += 1
+
+    def new_search(self, age: int = None) -> None:
+        """
+        Entries stored before this call become the first ones to be replaced.
+        :param age: age of the coming entries, e.g. the move number of the game. The current age plus one when None.
+        """
+        if age is None:
+            age = self.age + 1
+        self.age = age & 255
+
+    def clear(self) -> None:
+        self.buffer[:] = bytes(len(self.buffer))
+        self.age = 0
+
+    def get_stats_str(self):
+        return f'N probes: {self.n_probes} N hits: {self.n_hits} N stores: {self.n_stores} ' \
+               f'size: {self.n_entries} entries ({self.size_mb} MB)'
+
+
+class ScoreTable:
+    """
+    Same layout as TranspositionTable with only keys and scores, for the evaluation cache.
+    """
+    def __init__(self, size_mb: float = 16):
+        n_entries = 1
+        while 2 * n_entries * 16 <= size_mb * 1024 * 1024:
+            n_entries *= 2
+        self.size_mb = size_mb
+        self.n_entries = n_entries
+        self.mask = n_entries - 1
+        self.buffer = bytearray(16 * n_entries)
+        view = memoryview(self.buffer)
+        self.keys = view[0: 8 * n_entries].cast('Q')
+        self.scores = view[8 * n_entries:].cast('d')
+        self.n_probes = 0
+        self.n_gets = 0
+        self.n_inserts = 0
+
+    def get(self, key: int) -> Optional[float]:
+        self.n_probes += 1
+        index = key & self.mask
+        if self.keys[index] == key:
+            self.n_gets += 1
+            return self.scores[index]
+        return None
+
+    def insert(self, key: int, value: float) -> None:
+        index = key & self.mask
+        self.keys[index] = key
+        self.scores[index] = value
+        self.n_inserts += 1
+
+    def get_stats_str(self):
+        return f'N gets:{self.n_gets} N inserts: {self.n_inserts}'
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """
+    Transposition table held in a multiprocessing.shared_memory block, so that several search processes can use it
+    at the same time. The process creating it owns the block, the other ones attach to it by name.
+    Writes are not locked: each key is stored xored with the other fields of its entry, so that an entry torn by two
+    processes writing the same slot at once no longer matches its key and is ignored (lockless hashing).
+    """
+    def __init__(self, size_mb: float = 64, name: str = None):
+        n_bytes = n_entries_for_size(size_mb) * ENTRY_SIZE
+        self.owner = name is None
+        if self.owner:
+            self.shared_memory = SharedMemory(create=True, size=n_bytes)
+            self.shared_memory.buf[:n_bytes] = bytes(n_bytes)
+        else:
+            self.shared_memory = SharedMemory(name=name)
+        super().__init__(size_mb, buffer=self.shared_memory.buf[:n_bytes])
+        # Also run when the table is garbage collected or at exit, when close was not called
+        views = [self.keys, self.scores, self.score_bits, self.moves, self.depths, self.bounds, self.ages, self.buffer]
+        self._finalizer = weakref.finalize(self, release_shared_memory, self.shared_memory, views, self.owner)
+
+    @property
+    def name(self) -> str:
+        return self.shared_memory.name
+
+    def _attach(self, buffer):
+        super()._attach(buffer)
+        n = self.n_entries
+        self.score_bits = memoryview(buffer)[8 * n: 16 * n].cast('Q')
+
+    def probe(self, key: int) -> Optional[Tuple[int, float, int, Optional[Move]]]:
+        self.n_probes += 1
+        index = key & self.mask
+        # Each field is read once: another process may be writing the entry meanwhile
+        score_bits = self.score_bits[index]
+        packed_move = self.moves[index]
+        depth = self.depths[index]
+        bound = self.bounds[index]
+        if self.keys[index] ^ entry_checksum(score_bits, packed_move, depth, bound) != key:
+            return None
+        self.n_hits += 1
+        return depth, self.scores[index], bound, unpack_move(packed_move)
+
+    def probe_move(self, key: int) -> Optional[Move]:
+        entry = self.probe(key)
+        return None if entry is None else entry[3]
+
+    def store(self, key: int, depth: int, score: float, bound: int, move: Optional[Move]) -> None:
+        index = key & self.mask
+        stored_key = self.keys[index] ^ entry_checksum(self.score_bits[index], self.moves[index],
+                                                       self.depths[index], self.bounds[index])
+        same_position = stored_key == key
+        if same_position or self.ages[index] != self.age or depth >= self.depths[index]:
+            packed_move = pack_move(move)
+            if same_position and packed_move == 0:
+                packed_move = self.moves[index]
+            self.scores[index] = score
+            self.moves[index] = packed_move
+            self.depths[index] = depth
+            self.bounds[index] = bound
+            self.ages[index] = self.age
+            self.keys[index] = key ^ entry_checksum(self.score_bits[index], packed_move, depth, bound)
+            self.n_stores += 1
+
+    def close(self) -> None:
+        """Detaches from the shared block, which is also destroyed when called by its owner."""
+        self._finalizer()
+
+
+def release_shared_memory(shared_memory: SharedMemory, views, owner: bool) -> None:
+    for view in views:
+        view.release()
+    shared_memory.close()
+    if owner:
+        shared_memory.unlink()
+
+
+def entry_checksum(score_bits: int, packed_move: int, depth: int, bound: int) -> int:
+    return score_bits ^ packed_move ^ ((depth & 255) << 16) ^ (bound << 24)